@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,12 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_without_pool(settings, tmp_path):
+    # Пул нарезки миниатюр пишет в хранилище sorl уже после коммита -
+    # одновременно с очисткой базы в конце транзакционного теста.
+    # Картинки и миниатюры тестов не попадают в настоящий MEDIA_ROOT.
+    settings.THUMBNAIL_WORKERS = 0
+    settings.MEDIA_ROOT = str(tmp_path)
@@ -47,7 +47,7 @@ class TestCreateView:
         assert 'image' in response.context['form'].fields, (
             'Проверьте, что в форме `form` на странице `/create/` есть поле `image`'
         )
-        assert type(response.context['form'].fields['image']) == forms.fields.ImageField, (
+        assert isinstance(response.context['form'].fields['image'], forms.fields.ImageField), (
             'Проверьте, что в форме `form` на странице `/create/` поле `image` типа `ImageField`'
         )
 
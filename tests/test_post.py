@@ -181,7 +181,7 @@ class TestPostEditView:
         assert 'image' in response.context['form'].fields, (
             'Проверьте, что в форме `form` на странице `/posts/<post_id>/edit/` есть поле `image`'
         )
-        assert type(response.context['form'].fields['image']) == forms.fields.ImageField, (
+        assert isinstance(response.context['form'].fields['image'], forms.fields.ImageField), (
             'Проверьте, что в форме `form` на странице `/posts/<post_id>/edit/` поле `image` типа `ImageField`'
         )
 
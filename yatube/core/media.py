@@ -0,0 +1,142 @@
+"""Отдача файлов из MEDIA_ROOT.
+
+django.conf.urls.static годится только для разработки: он читает файл
+целиком и не знает ни Range, ни условных запросов. Здесь файл
+отдаётся с ETag и Last-Modified, долгим Cache-Control и поддержкой
+Range, так что браузер докачивает и перепроверяет картинки без полной
+пересылки.
+
+Если перед Django стоит прокси, отдачу можно передать ему заголовком
+X-Sendfile или X-Accel-Redirect (settings.MEDIA_SENDFILE). Без прокси
+файл уходит через FileResponse: WSGI-сервер с wsgi.file_wrapper
+(gunicorn, uWSGI) отправляет его через sendfile без копирования в
+Python.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Открытый файл, из которого читается не больше length байт от start.
+
+    fileno() отдаётся как есть: sendfile у WSGI-сервера начнёт с текущей
+    позиции и отправит Content-Length байт.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Пара (start, end) включительно, None - отдать целиком, или
+    ValueError, если диапазон вне файла.
+
+    Поддерживается один диапазон; на несколько сразу (multipart) файл
+    отдаётся целиком, это разрешено RFC 7233.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def range_allowed(request, etag, last_modified):
+    """If-Range: диапазон действует, только если файл не менялся."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+@require_safe
+def serve(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+    etag = '"{:x}-{:x}"'.format(stat.st_size, stat.st_mtime_ns)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}',
+    }
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=int(stat.st_mtime))
+    if response is None:
+        response = file_response(request, path, fullpath, stat.st_size,
+                                 range_allowed(request, etag, stat.st_mtime))
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def file_response(request, path, fullpath, size, use_range):
+    content_type = mimetypes.guess_type(fullpath)[0]
+    content_type = content_type or 'application/octet-stream'
+    mode = settings.MEDIA_SENDFILE
+    if mode:
+        # Файл и Range отдаёт прокси, Django только проверил доступ.
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path
+        else:
+            response['X-Sendfile'] = fullpath
+        return response
+    try:
+        byte_range = use_range and parse_range(
+            request.META.get('HTTP_RANGE', ''), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    response = FileResponse(RangeFile(open(fullpath, 'rb'), start,
+                                      end - start + 1),
+                            content_type=content_type)
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import Client, TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE=None,
+                   THUMBNAIL_WORKERS=0)
+class MediaServeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.content = bytes(range(256)) * 4
+        with open(f'{TEMP_MEDIA_ROOT}/file.png', 'wb') as file:
+            file.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.url = settings.MEDIA_URL + 'file.png'
+
+    def test_full_file(self):
+        '''Файл отдаётся целиком с валидаторами и Cache-Control'''
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+    def test_conditional_get(self):
+        '''If-None-Match и If-Modified-Since дают 304'''
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code, 304)
+
+    def test_ranges(self):
+        '''Range отдаёт часть файла с кодом 206'''
+        cases = {
+            'bytes=10-19': (10, 19),
+            'bytes=1000-': (1000, 1023),
+            'bytes=-4': (1020, 1023),
+            'bytes=1020-5000': (1020, 1023),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content),
+                                 self.content[start:end + 1])
+                self.assertEqual(response['Content-Range'],
+                                 f'bytes {start}-{end}/1024')
+
+    def test_unsatisfiable_range(self):
+        '''Диапазон за концом файла - 416'''
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_stale_if_range(self):
+        '''Если файл изменился, If-Range отменяет диапазон'''
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_proxy_hand_off(self):
+        '''В режиме прокси тело пустое, файл указан в заголовке'''
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + 'file.png')
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'],
+                         f'{TEMP_MEDIA_ROOT}/file.png')
+
+    def test_outside_media_root(self):
+        '''Пути вне MEDIA_ROOT и несуществующие файлы - 404'''
+        for path in ('../settings.py', 'missing.png'):
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, 404)
@@ -1,26 +1,102 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
+from . import search
 from .models import Group, Post, Comment
+from .utils import AdminPaginator, with_probed_dates
 
 
-class PostAdmin(admin.ModelAdmin):
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которому выбранный объект передаёт форма.
+
+    В списке админки связанные объекты уже загружены через
+    list_select_related, и запрашивать подпись выбранного значения
+    отдельно для каждой строки не нужно.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        chosen = {str(v) for v in value if v}
+        if (self.selected is None
+                or chosen != {str(obj.pk) for obj in self.selected}):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for obj in self.selected:
+            label = self.choices.field.label_from_instance(obj)
+            options.append(self.create_option(name, obj.pk, label, True,
+                                              len(options)))
+        return [(None, options, 0)]
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Общие настройки списков для больших таблиц."""
+    paginator = AdminPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # date_hierarchy находит даты пробами по индексу, см. probe_dates.
+        return with_probed_dates(super().get_queryset(request))
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.autocomplete_fields:
+            kwargs.setdefault('widget', PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        base = super().get_changelist_form(request, **kwargs)
+
+        class ChangelistForm(base):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name, field in self.fields.items():
+                    widget = getattr(field.widget, 'widget', field.widget)
+                    if isinstance(widget, PreloadedAutocompleteSelect):
+                        related = getattr(self.instance, name)
+                        widget.selected = [related] if related else []
+
+        return ChangelistForm
+
+
+class PostAdmin(ScalableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Индекс FTS5 из posts.search вместо LIKE '%...%' по всей таблице.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'slug', 'description',)
+    search_fields = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created',)
+    list_select_related = ('post', 'author')
     list_filter = ('created',)
     search_fields = ('text',)
+    date_hierarchy = 'created'
+    autocomplete_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_comments(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,183 @@
+"""Замеры маршрутов posts/urls.py на заполненной базе.
+
+Для каждого маршрута считаются число запросов к БД, время ответа и пик
+памяти Python. Превышение бюджета из ROUTE_BUDGETS считается регрессией:
+так ловятся, например, N+1 запросы в шаблонах лент.
+
+Маршруты записи замеряются самой записью: POST с данными из ROUTE_DATA,
+подписка на автора, на которого читатель ещё не подписан, и отписка от
+того, на кого подписан. Каждый проход откатывается, так что все проходы
+застают одну и ту же базу.
+"""
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial
+
+from django.core.cache import cache
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import counters, search, tags, timeline, trending, urls
+from .models import Follow, Group, Post, User
+
+BATCH_SIZE: int = 150
+
+Budget = namedtuple('Budget', 'queries ms kb')
+Measure = namedtuple('Measure', 'name url status queries ms kb')
+
+# Бюджет маршрута: число запросов, время в мс и пик памяти в КБ.
+ROUTE_BUDGETS = {
+    'index': Budget(3, 150, 2048),
+    'group_list': Budget(4, 150, 2048),
+    'profile': Budget(6, 150, 2048),
+    'post_detail': Budget(4, 100, 2048),
+    'post_create': Budget(18, 100, 2048),
+    'post_edit': Budget(13, 100, 2048),
+    'add_comment': Budget(11, 100, 512),
+    'follow_index': Budget(5, 150, 2048),
+    'profile_follow': Budget(19, 100, 512),
+    'profile_unfollow': Budget(11, 50, 512),
+    'search': Budget(5, 150, 2048),
+    'tag_posts': Budget(3, 150, 2048),
+    'trending': Budget(6, 150, 2048),
+}
+# Строка запроса для маршрутов, которым без неё нечего показать.
+ROUTE_QUERIES = {
+    'search': 'q=Пост',
+}
+# Данные POST для маршрутов записи: без них замер попал бы в форму
+# или сразу в редирект.
+ROUTE_DATA = {
+    'post_create': {'text': 'Новый пост #тема0'},
+    'post_edit': {'text': 'Правка поста #тема1'},
+    'add_comment': {'text': 'Комментарий'},
+}
+
+
+def seed(posts, users, follows, groups=50):
+    """Заполняет базу пользователями, группами, постами и подписками.
+
+    Возвращает читателя: он подписан на follows авторов и сам автор
+    постов, поэтому ему доступны все маршруты.
+    """
+    User.objects.bulk_create(
+        (User(username=f'bench_{i}', password='!') for i in range(users)),
+        batch_size=BATCH_SIZE)
+    Group.objects.bulk_create(
+        (Group(title=f'Группа {i}', slug=f'bench-{i}', description='-')
+         for i in range(groups)),
+        batch_size=BATCH_SIZE)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    group_ids = list(Group.objects.values_list('id', flat=True))
+    rnd = random.Random(posts)
+    Post.objects.bulk_create(
+        (Post(text=f'Пост {i} #тема{i % 10}', author_id=rnd.choice(user_ids),
+              group_id=rnd.choice(group_ids + [None]))
+         for i in range(posts)),
+        batch_size=BATCH_SIZE)
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, author_id=author_id)
+         for user_id in user_ids
+         for author_id in rnd.sample(user_ids, min(follows, len(user_ids)))
+         if author_id != user_id),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    # bulk_create не шлёт сигналы, поэтому ленты, счётчики, поисковый
+    # индекс, теги и тренды собираем отдельно.
+    for user_id in Follow.objects.values_list(
+            'user_id', flat=True).distinct().iterator():
+        timeline.rebuild(user_id)
+    counters.recount_users()
+    counters.recount_groups()
+    search.rebuild()
+    tags.sync(Post.objects.only('id', 'text', 'pub_date').iterator(), {})
+    trending.rebuild()
+    return (User.objects.filter(posts__group__isnull=False,
+                                follower__isnull=False)
+            .order_by('id').first())
+
+
+def route_urls(reader):
+    """URL всех маршрутов приложения posts с данными читателя."""
+    post = reader.posts.filter(group__isnull=False).first()
+    sample = {'slug': post.group.slug,
+              'username': reader.username,
+              'tag': 'тема0',
+              'post_id': post.id}
+    # Подписка и отписка должны менять данные, а не только редиректить.
+    usernames = {
+        'profile_follow': User.objects.exclude(id=reader.id)
+        .exclude(following__user=reader).values_list('username', flat=True)
+        .first(),
+        'profile_unfollow': reader.follower.values_list(
+            'author__username', flat=True).first(),
+    }
+    for pattern in urls.urlpatterns:
+        kwargs = {name: sample[name] for name in pattern.pattern.converters}
+        if pattern.name in usernames:
+            kwargs['username'] = usernames[pattern.name]
+        url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+        if pattern.name in ROUTE_QUERIES:
+            url += '?' + ROUTE_QUERIES[pattern.name]
+        yield pattern.name, url
+
+
+@contextmanager
+def rolled_back():
+    """Проход замера: всё, что записал маршрут, откатывается.
+
+    Колбэки on_commit при откате не выполняются - работа после коммита
+    (нарезка миниатюр, удаление файлов) в замер не входит.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def measure(client, name, url, data=None):
+    """Замер холодного запроса к url: кэш очищается перед каждым проходом.
+
+    С data маршрут замеряется POST-запросом. Память меряется отдельным
+    проходом, потому что tracemalloc заметно замедляет код и исказил бы
+    время.
+    """
+    send = client.get if data is None else partial(client.post, data=data)
+    with rolled_back():
+        cache.clear()
+        send(url)
+    with rolled_back():
+        cache.clear()
+        reset_queries()
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = send(url)
+        elapsed = (time.perf_counter() - started) * 1000
+    # Следующий запрос шлёт request_started и очищает журнал запросов.
+    query_count = len(queries.captured_queries)
+    with rolled_back():
+        cache.clear()
+        tracemalloc.start()
+        send(url)
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return Measure(name, url, response.status_code, query_count, elapsed,
+                   peak)
+
+
+def run(reader):
+    client = Client()
+    client.force_login(reader)
+    return [measure(client, name, url, ROUTE_DATA.get(name))
+            for name, url in route_urls(reader)]
+
+
+def over_budget(result):
+    """Список превышений бюджета для одного замера."""
+    budget = ROUTE_BUDGETS[result.name]
+    return [f'{field}: {getattr(result, field):.0f} > {limit}'
+            for field, limit in budget._asdict().items()
+            if getattr(result, field) > limit]
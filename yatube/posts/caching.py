@@ -0,0 +1,55 @@
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+
+VERSION_KEY = 'version:{}'
+
+
+def get_version(scope):
+    """Текущая версия данных области scope для ключей кэша."""
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        # Начинаем со времени, а не с единицы: если ключ версии вытеснят
+        # из кэша, старые записи не совпадут с новой версией.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(scope):
+    """Инвалидирует все ключи, построенные на версии scope."""
+    key = VERSION_KEY.format(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(scope)
+
+
+def cache_feed(timeout, *scopes):
+    """Как cache_page, но в префикс ключа входят версии областей scopes.
+
+    Области - шаблоны строк, которые форматируются аргументами вью и
+    запросом, например 'follow:{request.user.id}'. Сигналы сбрасывают
+    версии при изменении данных, поэтому страницу можно держать в кэше
+    долго и всё равно сразу показывать новые посты - если кэш общий для
+    всех воркеров, см. settings.MEMCACHED_LOCATION.
+
+    Страница содержит шапку с именем пользователя, кнопки подписки и
+    его ленту, поэтому в префикс входит и сам зритель: у каждого
+    пользователя и у всех анонимов свои копии страниц. Одних версий
+    мало - у двух пользователей они могут совпасть.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = (get_version(scope.format(request=request, **kwargs))
+                        for scope in scopes)
+            viewer = f'user{request.user.pk}' if request.user.pk else 'anon'
+            prefix = ':'.join([view.__name__, viewer, *map(str, versions)])
+            cached_view = cache_page(timeout, key_prefix=prefix)(view)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
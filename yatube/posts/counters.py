@@ -0,0 +1,109 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Сигналы меняют счётчики атомарным UPDATE ... SET n = n + 1, поэтому
+шаблонам не нужен COUNT(*). Уменьшаются счётчики не ниже нуля, а save()
+моделей их не перезаписывает, см. models.CountersMixin. Команда
+recount_counters пересчитывает всё заново, если счётчики разошлись с
+данными.
+
+Так же считаются ссылки постов на файлы картинок: файл и его миниатюры
+удаляются, когда на него больше не ссылается ни один пост.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from sorl import thumbnail
+
+from .models import Comment, Follow, Group, ImageBlob, Post, User, UserStats
+
+logger = logging.getLogger(__name__)
+
+
+def _change(queryset, field, delta):
+    value = F(field) + delta
+    if delta < 0:
+        # Разошедшийся счётчик не должен ронять удаление на CHECK >= 0:
+        # его починит recount_counters.
+        value = Greatest(value, 0)
+    return queryset.update(**{field: value})
+
+
+def change_user(user_id, field, delta):
+    _change(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(id=group_id), 'posts_count', delta)
+
+
+def change_post(post_id, delta):
+    _change(Post.objects.filter(id=post_id), 'comments_count', delta)
+
+
+def delete_image(name):
+    """Удаляет файл картинки и её миниатюры, если на неё нет ссылок."""
+    # Ту же картинку могли загрузить снова, пока шла транзакция.
+    if ImageBlob.objects.filter(name=name).exists():
+        return
+    try:
+        thumbnail.delete(name, delete_file=False)
+        Post.image.field.storage.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        # Например, путь вне MEDIA_ROOT, записанный в пост напрямую.
+        logger.warning('Не удалось удалить картинку %s', name, exc_info=True)
+
+
+def change_image(name, delta):
+    if not name:
+        return
+    if delta > 0:
+        ImageBlob.objects.get_or_create(name=name)
+    _change(ImageBlob.objects.filter(name=name), 'refs', delta)
+    if delta < 0 and ImageBlob.objects.filter(name=name, refs=0).delete()[0]:
+        transaction.on_commit(lambda: delete_image(name))
+
+
+def _count(queryset, field):
+    """Подзапрос COUNT(*) по field = OuterRef('pk')."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def recount_users(users=None):
+    users = User.objects.all() if users is None else users
+    with transaction.atomic():
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=user_id) for user_id in
+             users.filter(stats__isnull=True).values_list('id', flat=True)),
+            ignore_conflicts=True)
+        stats = UserStats.objects.filter(user__in=users)
+        stats.update(
+            posts_count=_count(Post.objects, 'author'),
+            followers_count=_count(Follow.objects, 'author'),
+            following_count=_count(Follow.objects, 'user'))
+
+
+def recount_groups():
+    Group.objects.update(posts_count=_count(Post.objects, 'group'))
+
+
+def recount_posts():
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
+
+
+def recount_images():
+    with transaction.atomic():
+        ImageBlob.objects.bulk_create(
+            (ImageBlob(name=name) for name in
+             Post.objects.exclude(image='').values_list('image', flat=True)
+             .distinct().iterator()),
+            ignore_conflicts=True)
+        ImageBlob.objects.update(refs=Coalesce(Subquery(
+            Post.objects.filter(image=OuterRef('pk')).order_by()
+            .values('image').annotate(total=Count('pk')).values('total')),
+            0))
@@ -1,12 +1,24 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploads import check_image_header
+
+
+class CheckedImageField(forms.ImageField):
+    """ImageField, который сначала проверяет заголовок файла: неподходящий
+    файл не доходит до Pillow целиком."""
+
+    def to_python(self, data):
+        if data:
+            check_image_header(data)
+        return super().to_python(data)
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': CheckedImageField}
         help_texts = {'text': "Текст нового поста",
                       'group': "Группа, к которой будет относиться пост"}
 
@@ -0,0 +1,143 @@
+"""Замер пропускной способности загрузки картинок.
+
+Каждая картинка проходит тот же путь, что и загрузка из формы: пост
+сохраняется с файлом (хэширование и запись в хранилище, описание
+картинки сигналом), затем thumbnails.generate нарезает все варианты
+карточки. Пачка прогоняется последовательно, в пуле потоков и в пуле
+процессов; по результатам видно, сколько воркеров нужно под нарезку.
+"""
+import os
+import random
+import resource
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from multiprocessing import active_children, get_context
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from PIL import Image, ImageDraw
+
+from . import thumbnails
+from .models import Post
+
+MODES = ('serial', 'threads', 'processes')
+SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+if thumbnails.WEBP_ENABLED:
+    FORMATS['WEBP'] = 'webp'
+SAMPLE_INTERVAL: float = 0.01
+
+Result = namedtuple('Result', 'mode workers images seconds p50 p99 peak_mb')
+
+
+def synthetic_images(count, seed=0):
+    """Пары (имя, содержимое) картинок разных размеров и форматов.
+
+    Шум делает файлы похожими на фотографии по размеру, а прямоугольник
+    с номером - уникальными, иначе хранилище по содержимому сложило бы
+    одинаковые картинки в один файл.
+    """
+    rnd = random.Random(seed)
+    formats = list(FORMATS.items())
+    for index in range(count):
+        size = SIZES[index % len(SIZES)]
+        image_format, extension = formats[index % len(formats)]
+        image = Image.merge('RGB', [Image.effect_noise(size, 40)
+                                    for _ in range(3)])
+        ImageDraw.Draw(image).rectangle(
+            (0, 0, size[0] // 4, size[1] // 4),
+            fill=(rnd.randrange(256), index % 256, index // 256 % 256))
+        buffer = BytesIO()
+        image.save(buffer, image_format)
+        yield f'bench_{index}.{extension}', buffer.getvalue()
+
+
+def upload(author_id, name, content):
+    """Одна загрузка: пост с картинкой и её миниатюры. Время в секундах."""
+    started = time.perf_counter()
+    post = Post.objects.create(author_id=author_id, text=name,
+                               image=SimpleUploadedFile(name, content))
+    thumbnails.generate(post.image.name)
+    return time.perf_counter() - started
+
+
+def _upload_in_pool(author_id, name, content):
+    try:
+        return upload(author_id, name, content)
+    finally:
+        connections.close_all()
+
+
+def _rss_mb(pids):
+    """Резидентная память процессов pids по /proc, в МБ."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/statm') as statm:
+                total += int(statm.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total * resource.getpagesize() / 2 ** 20
+
+
+class PeakMemory(threading.Thread):
+    """Пик RSS процесса и его дочерних процессов, пока идёт замер.
+
+    tracemalloc не видит память Pillow и других процессов, поэтому
+    память раз в SAMPLE_INTERVAL читается из /proc.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = 0
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(SAMPLE_INTERVAL):
+            pids = [os.getpid()] + [child.pid for child in active_children()]
+            self.peak = max(self.peak, _rss_mb(pids))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finished.set()
+        self.join()
+
+
+def percentile(values, share):
+    """Значение, ниже которого лежит доля share замеров (nearest rank)."""
+    ordered = sorted(values)
+    rank = max(1, round(share * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run(mode, images, author_id, workers=1):
+    """Прогоняет images через загрузку в режиме mode."""
+    if mode == 'serial':
+        workers = 1
+    with PeakMemory() as memory:
+        started = time.perf_counter()
+        if mode == 'serial':
+            latencies = [upload(author_id, name, content)
+                         for name, content in images]
+        else:
+            if mode == 'threads':
+                pool = ThreadPoolExecutor(max_workers=workers)
+            else:
+                # Дочерние процессы откроют свои соединения с БД.
+                connections.close_all()
+                pool = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=get_context('fork'))
+            with pool:
+                latencies = list(pool.map(
+                    _upload_in_pool, [author_id] * len(images),
+                    *zip(*images)))
+        seconds = time.perf_counter() - started
+    return Result(mode, workers, len(images), seconds,
+                  percentile(latencies, 0.5) * 1000,
+                  percentile(latencies, 0.99) * 1000, memory.peak)
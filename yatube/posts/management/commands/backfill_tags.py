@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет хэштеги по текстам постов: для постов, '
+            'опубликованных до появления тегов, или после сбоя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('id').only('id', 'text', 'pub_date')
+        added = 0
+        done = 0
+        last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            with transaction.atomic():
+                added += tags.sync(batch, tags.indexed(
+                    [post.id for post in batch]))
+            done += len(batch)
+            self.stdout.write(f'Обработано постов: {done}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, добавлено тегов: {added}.'))
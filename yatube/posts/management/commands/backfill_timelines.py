@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты избранных авторов по существующим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users', help='id подписчика; можно '
+                            'указать несколько раз')
+
+    def handle(self, *args, **options):
+        followers = (Follow.objects.order_by('user_id')
+                     .values_list('user_id', flat=True).distinct())
+        if options['users']:
+            followers = followers.filter(user_id__in=options['users'])
+        done = 0
+        for user_id in followers.iterator():
+            timeline.rebuild(user_id)
+            done += 1
+            if done % timeline.BATCH_SIZE == 0:
+                self.stdout.write(f'Обработано подписчиков: {done}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны для {done} подписчиков.'))
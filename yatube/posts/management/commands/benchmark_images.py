@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import image_benchmarks
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет синтетические картинки через сохранение поста и '
+            'нарезку миниатюр последовательно, в потоках и в процессах; '
+            'печатает пропускную способность, p50/p99 и пик памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=60)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Размер пула потоков и процессов.')
+        parser.add_argument('--mode', choices=image_benchmarks.MODES,
+                            action='append', dest='modes',
+                            help='Режим; можно указать несколько раз, '
+                            'по умолчанию все.')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='yatube_bench_')
+        if connection.vendor == 'sqlite':
+            # Базу в памяти не увидят дочерние процессы - нужен файл.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                workdir, 'bench.sqlite3')
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(MEDIA_ROOT=os.path.join(workdir, 'media'),
+                                   THUMBNAIL_WORKERS=0):
+                author = User.objects.create_user(username='bench')
+                for seed, mode in enumerate(
+                        options['modes'] or image_benchmarks.MODES):
+                    # Свои картинки на каждый режим: одинаковые хранилище
+                    # сложило бы в один файл с готовыми миниатюрами.
+                    images = list(image_benchmarks.synthetic_images(
+                        options['images'], seed))
+                    result = image_benchmarks.run(
+                        mode, images, author.id, options['workers'])
+                    self.stdout.write(
+                        f'{result.mode:<10} x{result.workers:<3} '
+                        f'{result.images / result.seconds:>7.1f} карт./с '
+                        f'p50 {result.p50:>7.1f} мс '
+                        f'p99 {result.p99:>7.1f} мс '
+                        f'пик {result.peak_mb:>7.1f} МБ')
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
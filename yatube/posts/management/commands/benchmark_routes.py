@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую базу и замеряет запросы, время и память '
+            'каждого маршрута posts. Падает, если маршрут вышел из бюджета.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--groups', type=int, default=50)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            self.stdout.write('Заполняем базу...')
+            reader = benchmarks.seed(options['posts'], options['users'],
+                                     options['follows'], options['groups'])
+            results = benchmarks.run(reader)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        failed = []
+        for result in results:
+            problems = benchmarks.over_budget(result)
+            self.stdout.write(
+                f'{result.name:<18} {result.status} '
+                f'{result.queries:>4} запр. {result.ms:>8.1f} мс '
+                f'{result.kb:>8.0f} КБ {"; ".join(problems)}')
+            if problems:
+                failed.append(result.name)
+        if failed:
+            raise CommandError(
+                'Превышен бюджет маршрутов: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS('Все маршруты в бюджете.'))
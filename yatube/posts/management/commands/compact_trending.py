@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из трендов затухшие посты и группы и собирает список '
+            'лучших в кэше заново. Запускать периодически, например раз '
+            'в час из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать ранги по постам и '
+                            'комментариям с нуля.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = trending.rebuild()
+            self.stdout.write(f'Пересчитано объектов: {count}')
+        deleted = trending.compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, удалено затухших: {deleted}.'))
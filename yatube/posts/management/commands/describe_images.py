@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import thumbnails
+from posts.caching import bump_version
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры и заглушки картинок у постов, загруженных '
+            'до их появления.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        posts = (Post.objects.exclude(image='')
+                 .filter(image_placeholder='').order_by('id')
+                 .only('id', 'image'))
+        done = 0
+        last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for post in batch:
+                try:
+                    with post.image.open() as file:
+                        meta = thumbnails.describe(file)
+                except Exception as error:
+                    self.stderr.write(f'{post.image.name}: {error}')
+                    continue
+                # update() без сигналов. updated сдвигаем: кэш карточки
+                # поста ключуется по нему, а заглушка выводится в карточке.
+                Post.objects.filter(id=post.id).update(
+                    image_width=meta[0], image_height=meta[1],
+                    image_placeholder=meta[2], updated=timezone.now())
+                done += 1
+            self.stdout.write(f'Обработано постов: {done}')
+        if done:
+            # Страницы лент тоже закэшированы целиком.
+            bump_version('posts')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, описано картинок: {done}.'))
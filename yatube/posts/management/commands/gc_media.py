@@ -0,0 +1,117 @@
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl import thumbnail
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import ImageBlob, Post
+
+
+def walk(root, directory):
+    """Относительные имена файлов под root/directory, по одному.
+
+    os.scandir не строит список каталога целиком, так что память не
+    зависит от числа файлов.
+    """
+    stack = [os.path.join(root, directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield (os.path.relpath(entry.path, root)
+                           .replace(os.sep, '/'), entry.stat().st_mtime)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def orphan_uploads(names):
+    """Картинки, на которые не ссылается ни один пост."""
+    used = set(Post.objects.filter(image__in=names)
+               .values_list('image', flat=True))
+    used.update(ImageBlob.objects.filter(name__in=names)
+                .values_list('name', flat=True))
+    return [name for name in names if name not in used]
+
+
+def orphan_thumbnails(names):
+    """Миниатюры, о которых не знает хранилище ключей sorl."""
+    keys = {add_prefix(ImageFile(name, default.storage).key): name
+            for name in names}
+    known = set(KVStoreModel.objects.filter(key__in=keys)
+                .values_list('key', flat=True))
+    return [name for key, name in keys.items() if key not in known]
+
+
+class Command(BaseCommand):
+    help = ('Находит в MEDIA_ROOT картинки постов и миниатюры, на которые '
+            'ничего не ссылается, и удаляет их или переносит в карантин.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Переносить файлы в DIR вместо удаления.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Не больше файлов в секунду; 0 - без '
+                            'ограничения.')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе стольких секунд: '
+                            'пост с ними может быть ещё не сохранён.')
+
+    def remove(self, name, options):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if options['quarantine']:
+            target = os.path.join(options['quarantine'], name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+
+    def collect(self, directory, find_orphans, options):
+        root = settings.MEDIA_ROOT
+        deadline = time.time() - options['min_age']
+        found = 0
+        for batch in batches(walk(root, directory), options['batch_size']):
+            names = [name for name, mtime in batch if mtime < deadline]
+            for name in find_orphans(names) if names else []:
+                found += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                    continue
+                if directory != sorl_settings.THUMBNAIL_PREFIX:
+                    thumbnail.delete(name, delete_file=False)
+                self.remove(name, options)
+                if options['rate']:
+                    time.sleep(1 / options['rate'])
+        return found
+
+    def handle(self, *args, **options):
+        uploads = self.collect(Post.image.field.upload_to, orphan_uploads,
+                               options)
+        thumbnails = self.collect(sorl_settings.THUMBNAIL_PREFIX,
+                                  orphan_thumbnails, options)
+        action = 'Найдено' if options['dry_run'] else 'Убрано'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} картинок: {uploads}, миниатюр: {thumbnails}.'))
@@ -0,0 +1,24 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Раскладывает по лентам посты авторов, переставших быть '
+            'популярными, и подрезает ленты до TIMELINE_SIZE записей. '
+            'Запускать периодически, например раз в час из cron.')
+
+    def handle(self, *args, **options):
+        promoted, demoted = timeline.rebalance()
+        self.stdout.write(f'Популярных авторов: +{promoted}, -{demoted}')
+        users = timeline.overfull_users().iterator()
+        trimmed = 0
+        while True:
+            batch = list(islice(users, timeline.BATCH_SIZE))
+            if not batch:
+                break
+            trimmed += timeline.trim(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, удалено записей лент: {trimmed}.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс постов и комментариев '
+            'и оптимизирует его.')
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            self.stdout.write('Индекс FTS5 есть только на SQLite, '
+                              'поиск работает через icontains.')
+            return
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран.'))
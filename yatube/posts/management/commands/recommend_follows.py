@@ -0,0 +1,29 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «на кого подписаться» по графу '
+            'подписок. Запускать периодически, например раз в сутки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Число процессов; 1 - без пула.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=recommendations.CHUNK_SIZE,
+                            help='Пользователей в одной задаче воркера.')
+        parser.add_argument('--limit', type=int,
+                            default=recommendations.TOP_N,
+                            help='Рекомендаций на пользователя.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        total = recommendations.run(options['workers'],
+                                    options['chunk_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, рекомендаций: {total}, '
+            f'{time.perf_counter() - started:.1f} с.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'и ссылки на картинки по данным в базе.')
+
+    def handle(self, *args, **options):
+        counters.recount_users()
+        counters.recount_groups()
+        counters.recount_posts()
+        counters.recount_images()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
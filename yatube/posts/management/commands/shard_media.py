@@ -0,0 +1,63 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from posts import counters
+from posts.caching import bump_version
+from posts.models import ImageBlob, Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в подкаталоги по хэшу содержимого '
+            'и обновляет пути в постах пачками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='сколько файлов обрабатывать в одной '
+                            'транзакции')
+
+    def move(self, storage, name):
+        """Копирует файл под новое имя и переводит на него посты.
+
+        Старый файл удаляется только после коммита, поэтому до него
+        посты всегда ссылаются на существующий файл.
+        """
+        try:
+            with storage.open(name) as content:
+                new_name = storage.save(name, content)
+        except (OSError, SuspiciousFileOperation):
+            self.stderr.write(f'Нет файла {name}, пропущен.')
+            return False
+        if new_name == name:
+            return False
+        # updated меняется, чтобы сбросить кэш карточек со старым адресом.
+        Post.objects.filter(image=name).update(image=new_name,
+                                               updated=timezone.now())
+        refs = ImageBlob.objects.get(name=name).refs
+        ImageBlob.objects.get_or_create(name=new_name)
+        ImageBlob.objects.filter(name=new_name).update(refs=F('refs') + refs)
+        ImageBlob.objects.filter(name=name).delete()
+        transaction.on_commit(lambda: counters.delete_image(name))
+        return True
+
+    def handle(self, *args, **options):
+        storage = Post.image.field.storage
+        moved = 0
+        last = ''
+        while True:
+            names = list(ImageBlob.objects.filter(name__gt=last)
+                         .order_by('name').values_list('name', flat=True)
+                         [:options['batch_size']])
+            if not names:
+                break
+            last = names[-1]
+            with transaction.atomic():
+                for name in names:
+                    if not storage.is_sharded(name):
+                        moved += self.move(storage, name)
+            bump_version('posts')
+            self.stdout.write(f'Перенесено файлов: {moved}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово, перенесено файлов: {moved}.'))
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:20
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # FTS5 есть только в SQLite, на других СУБД поиск идёт через icontains.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5("
+        "text, comments, tokenize = 'unicode61 remove_diacritics 2', "
+        "prefix = '2 3')")
+    schema_editor.execute(
+        "INSERT INTO posts_search (rowid, text, comments) "
+        "SELECT post.id, post.text, ("
+        "SELECT group_concat(comment.text, ' ') FROM posts_comment comment "
+        "WHERE comment.post_id = post.id) FROM posts_post post")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_meta'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
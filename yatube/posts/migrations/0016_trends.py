@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('group', 'Группа')], max_length=5, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id поста или группы')),
+                ('rank', models.FloatField(verbose_name='Ранг')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trend',
+            index=models.Index(fields=['kind', '-rank'], name='trend_kind_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trend',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_trend'),
+        ),
+    ]
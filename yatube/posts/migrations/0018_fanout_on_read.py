@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-16 23:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_popular(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gt=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False, verbose_name='Популярный автор'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['fanout_on_read'], name='stats_fanout_idx'),
+        ),
+        migrations.RunPython(mark_popular, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-17 10:05
+
+from django.db import migrations
+
+FTS_OPTIONS = ("tokenize = 'unicode61 remove_diacritics 2', "
+               "prefix = '2 3'")
+
+
+def split_index(apps, schema_editor):
+    # Строка на комментарий вместо склеенных комментариев в строке поста:
+    # правка комментария меняет одну строку индекса.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE posts_search USING fts5(text, {FTS_OPTIONS})')
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, text) '
+        'SELECT id, text FROM posts_post')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS posts_comment_search USING '
+        f'fts5(text, post_id UNINDEXED, {FTS_OPTIONS})')
+    schema_editor.execute(
+        'INSERT INTO posts_comment_search (rowid, text, post_id) '
+        'SELECT id, text, post_id FROM posts_comment')
+
+
+def merge_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_comment_search')
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_search USING '
+        f'fts5(text, comments, {FTS_OPTIONS})')
+    schema_editor.execute(
+        "INSERT INTO posts_search (rowid, text, comments) "
+        "SELECT post.id, post.text, ("
+        "SELECT group_concat(comment.text, ' ') FROM posts_comment comment "
+        "WHERE comment.post_id = post.id) FROM posts_post post")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_fanout_on_read'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_index, merge_index),
+    ]
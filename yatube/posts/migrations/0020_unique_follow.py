@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-17 10:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Ограничение было в модели Follow и раньше, но без миграции: в базе
+    # могли накопиться повторные подписки. Остаётся самая ранняя, счётчики
+    # подписок после этого пересчитывает команда recount_counters.
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = (Follow.objects.values('user', 'author').order_by()
+                  .annotate(first=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for row in duplicates.iterator():
+        (Follow.objects.filter(user=row['user'], author=row['author'])
+         .exclude(id=row['first']).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
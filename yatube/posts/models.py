@@ -1,23 +1,64 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class CountersMixin:
+    """Модель с денормализованными счётчиками из posts.counters.
+
+    Счётчики меняются только атомарными UPDATE. Обычный save() уже
+    сохранённой записи их не пишет: иначе значение, прочитанное вместе с
+    записью, затёрло бы то, что насчитали сигналы с тех пор.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            skip = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skip]
+        super().save(*args, **kwargs)
+
+
+class Group(CountersMixin, models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Постов', default=0,
+                                              editable=False)
+
+    COUNTER_FIELDS = ('posts_count',)
 
     def __str__(self) -> str:
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    # Поля поста, автора и группы, которые выводит карточка в ленте.
+    FEED_FIELDS = ('text', 'pub_date', 'updated', 'image', 'image_width',
+                   'image_height', 'image_placeholder', 'author', 'group',
+                   'author__username', 'author__first_name',
+                   'author__last_name', 'group__slug', 'group__title')
+
+    def for_feed(self):
+        """Посты для лент: автор и группа в том же запросе, без лишних
+        колонок."""
+        return (self.select_related('author', 'group')
+                .only(*self.FEED_FIELDS))
+
+
+class Post(CountersMixin, models.Model):
     text = models.TextField('Текст поста',
                             help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,14 +77,37 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Заполняются при загрузке картинки, см. posts.signals.describe_image.
+    image_width = models.PositiveIntegerField('Ширина картинки', null=True,
+                                              blank=True, editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки', null=True,
+                                               blank=True, editable=False)
+    image_placeholder = models.TextField('Заглушка картинки', blank=True,
+                                         editable=False)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0,
+                                                 editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('comments_count',)
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ("-pub_date",)
+        # Под ленты с курсором по (pub_date, id): общая, автора и группы.
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -65,6 +129,14 @@ class Comment(models.Model):
     def __str__(self):
         return self.text
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            # Под date_hierarchy и фильтр по дате в админке.
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -75,3 +147,92 @@ class Follow(models.Model):
     class Meta:
         constraints = [models.UniqueConstraint
                        (fields=['user', 'author'], name='unique_follow')]
+        # Подписчики автора для раскладки постов по лентам.
+        indexes = [models.Index(fields=['author', 'user'],
+                                name='follow_author_user_idx')]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые обновляют сигналы posts.signals."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Посты автора сливаются с лентами при чтении, см. posts.timeline.
+    fanout_on_read = models.BooleanField('Популярный автор', default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['fanout_on_read'],
+                                name='stats_fanout_idx')]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        constraints = [models.UniqueConstraint
+                       (fields=['user', 'post'], name='unique_timeline_post')]
+        indexes = [models.Index(fields=['user', '-pub_date', '-post'],
+                                name='timeline_user_date_idx')]
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+
+class PostTag(models.Model):
+    """Хэштег поста; строки заполняет posts.tags по тексту поста."""
+    tag = models.CharField('Тег', max_length=50)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='tags')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [models.UniqueConstraint
+                       (fields=['tag', 'post'], name='unique_post_tag')]
+        indexes = [models.Index(fields=['tag', '-pub_date', '-post'],
+                                name='post_tag_date_idx')]
+
+
+class Trend(models.Model):
+    """Счёт поста или группы в трендах с затуханием, см. posts.trending.
+    """
+    POST = 'post'
+    GROUP = 'group'
+    KINDS = ((POST, 'Пост'), (GROUP, 'Группа'))
+
+    kind = models.CharField('Тип', max_length=5, choices=KINDS)
+    object_id = models.PositiveIntegerField('id поста или группы')
+    rank = models.FloatField('Ранг')
+
+    class Meta:
+        constraints = [models.UniqueConstraint
+                       (fields=['kind', 'object_id'], name='unique_trend')]
+        indexes = [models.Index(fields=['kind', '-rank'],
+                                name='trend_kind_rank_idx')]
+
+
+class Recommendation(models.Model):
+    """Автор, на которого стоит подписаться пользователю; строки пишет
+    команда recommend_follows, см. posts.recommendations."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='recommendations')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='recommended_to')
+    score = models.FloatField('Вес')
+
+    class Meta:
+        constraints = [models.UniqueConstraint
+                       (fields=['user', 'author'],
+                        name='unique_recommendation')]
+        indexes = [models.Index(fields=['user', '-score'],
+                                name='recommendation_user_idx')]
@@ -0,0 +1,181 @@
+"""Полнотекстовый поиск по постам и комментариям на SQLite FTS5.
+
+Индекс - две виртуальные таблицы (миграция 0019): posts_search со
+строкой на пост (rowid - id поста, колонка text) и posts_comment_search
+со строкой на комментарий (rowid - id комментария, колонки text и
+post_id). Сигналы posts.signals меняют одну строку при сохранении и
+удалении поста или комментария - сколько бы комментариев ни было у
+поста. Команда rebuild_search пересобирает индекс целиком.
+
+Запрос пользователя разбивается на слова, каждое ищется как префикс
+("слово"*), поэтому синтаксис FTS5 из строки поиска не исполняется.
+Пост находится, если все слова есть в его тексте или в одном из
+комментариев. Ранжируются по bm25 не больше MAX_RESULTS самых новых
+совпадений из каждой таблицы, совпадение в тексте поста весит больше,
+чем в комментарии; столько же совпадений не больше MAX_RESULTS
+показывает и счётчик: на частых словах полный COUNT и сортировка всех
+совпадений по миллионам строк были бы дорогими.
+
+На других СУБД таблиц нет, и поиск откатывается к icontains.
+"""
+import re
+
+from django.db import connection
+from django.utils.functional import cached_property
+
+from .models import Post
+from .utils import WindowedPaginator
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_comment_search'
+MAX_RESULTS: int = 1000
+# Во сколько раз совпадение в тексте поста весит больше, чем в комментарии.
+TEXT_WEIGHT: float = 2.0
+WORD = re.compile(r'\w+')
+# Посты-кандидаты с лучшим рангом (bm25 отрицателен, меньше - лучше):
+# последние MAX_RESULTS совпадений в постах и в комментариях, из них -
+# MAX_RESULTS самых новых постов.
+CANDIDATES = (
+    'SELECT post_id, min(rank) AS rank FROM ('
+    f'SELECT * FROM (SELECT rowid AS post_id, '
+    f'bm25({TABLE}) * {TEXT_WEIGHT} AS rank FROM {TABLE} '
+    f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s) '
+    'UNION ALL '
+    f'SELECT * FROM (SELECT post_id, bm25({COMMENTS_TABLE}) AS rank '
+    f'FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s '
+    'ORDER BY rowid DESC LIMIT %s)'
+    ') GROUP BY post_id ORDER BY post_id DESC LIMIT %s')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_query(query):
+    """Строка MATCH из слов запроса или '', если слов нет."""
+    words = WORD.findall(query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _execute(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def index_post(post, created=False):
+    if not enabled():
+        return
+    if created or not _execute(
+            f'UPDATE {TABLE} SET text = %s WHERE rowid = %s',
+            [post.text, post.id]):
+        _execute(f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)',
+                 [post.id, post.text])
+
+
+def unindex_post(post_id):
+    if enabled():
+        _execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_comment(comment, created=False):
+    if not enabled():
+        return
+    if created or not _execute(
+            f'UPDATE {COMMENTS_TABLE} SET text = %s WHERE rowid = %s',
+            [comment.text, comment.id]):
+        _execute(f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+                 'VALUES (%s, %s, %s)',
+                 [comment.id, comment.text, comment.post_id])
+
+
+def unindex_comment(comment_id):
+    if enabled():
+        _execute(f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s',
+                 [comment_id])
+
+
+def rebuild():
+    """Заполняет индекс заново по постам и комментариям в базе."""
+    if not enabled():
+        return
+    _execute(f'DELETE FROM {TABLE}')
+    _execute(f'INSERT INTO {TABLE} (rowid, text) '
+             'SELECT id, text FROM posts_post')
+    _execute(f'DELETE FROM {COMMENTS_TABLE}')
+    _execute(f'INSERT INTO {COMMENTS_TABLE} (rowid, text, post_id) '
+             'SELECT id, text, post_id FROM posts_comment')
+    for table in (TABLE, COMMENTS_TABLE):
+        _execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+
+
+def _filter(queryset, query, table):
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if not enabled():
+        return queryset.filter(text__icontains=query)
+    db_table = queryset.model._meta.db_table
+    return queryset.extra(
+        where=[f'{db_table}.id IN '
+               f'(SELECT rowid FROM {table} WHERE {table} MATCH %s)'],
+        params=[match])
+
+
+def filter_posts(queryset, query):
+    """Посты queryset, в тексте которых есть слова запроса."""
+    return _filter(queryset, query, TABLE)
+
+
+def filter_comments(queryset, query):
+    """Комментарии queryset, в тексте которых есть слова запроса."""
+    return _filter(queryset, query, COMMENTS_TABLE)
+
+
+class SearchResults:
+    """Выдача поиска для Paginator: срез - один запрос к индексу и один
+    к постам, len - ограниченный MAX_RESULTS подсчёт."""
+
+    def __init__(self, query):
+        self.query = query
+        self.match = match_query(query)
+
+    def _params(self):
+        return [self.match, MAX_RESULTS, self.match, MAX_RESULTS,
+                MAX_RESULTS]
+
+    def __len__(self):
+        if not self.match:
+            return 0
+        if not enabled():
+            return min(self._fallback().count(), MAX_RESULTS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM ({CANDIDATES})',
+                           self._params())
+            return cursor.fetchone()[0]
+
+    def _fallback(self):
+        return Post.objects.for_feed().filter(text__icontains=self.query)
+
+    def __getitem__(self, page):
+        if not self.match:
+            return []
+        if not enabled():
+            return list(self._fallback()[page])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM ({CANDIDATES}) '
+                'ORDER BY rank, post_id DESC LIMIT %s OFFSET %s',
+                self._params() + [page.stop - page.start, page.start])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class SearchPaginator(WindowedPaginator):
+    """Нумерованные страницы выдачи; число совпадений даёт SearchResults.
+    """
+
+    @cached_property
+    def count(self):
+        return len(self.object_list)
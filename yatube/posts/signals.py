@@ -0,0 +1,219 @@
+import logging
+
+from django.db import transaction
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, search, tags, thumbnails, timeline, trending
+from .caching import bump_version
+from .models import Comment, Follow, Group, Post, Trend, User, UserStats
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_timeline(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Через __dict__, чтобы не догружать отложенное поле из only().
+    instance._saved_group_id = instance.__dict__.get('group_id', DEFERRED)
+    image = instance.__dict__.get('image', DEFERRED)
+    instance._saved_image = getattr(image, 'name', image)
+    instance._saved_text = instance.__dict__.get('text', DEFERRED)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    old_group_id = instance._saved_group_id
+    with transaction.atomic():
+        if created:
+            counters.change_user(instance.author_id, 'posts_count', 1)
+            counters.change_group(instance.group_id, 1)
+        elif old_group_id not in (DEFERRED, instance.group_id):
+            counters.change_group(old_group_id, -1)
+            counters.change_group(instance.group_id, 1)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    with transaction.atomic():
+        counters.change_user(instance.author_id, 'posts_count', -1)
+        counters.change_group(instance.group_id, -1)
+
+
+@receiver(pre_save, sender=Post)
+def describe_image(sender, instance, **kwargs):
+    """Размеры и заглушка считаются один раз - когда файл загружен."""
+    if not instance.image:
+        instance.image_width = instance.image_height = None
+        instance.image_placeholder = ''
+    elif not instance.image._committed:
+        try:
+            (instance.image_width, instance.image_height,
+             instance.image_placeholder) = thumbnails.describe(
+                instance.image.file)
+        except Exception:
+            logger.exception('Не удалось прочитать картинку %s',
+                             instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_image(sender, instance, created, **kwargs):
+    old_image = instance._saved_image
+    with transaction.atomic():
+        if created:
+            counters.change_image(instance.image.name, 1)
+        elif old_image not in (DEFERRED, instance.image.name):
+            counters.change_image(old_image, -1)
+            counters.change_image(instance.image.name, 1)
+    instance._saved_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def uncount_image(sender, instance, **kwargs):
+    counters.change_image(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        with transaction.atomic():
+            counters.change_user(instance.user_id, 'following_count', 1)
+            counters.change_user(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_save, sender=Follow)
+def promote_author(sender, instance, created, **kwargs):
+    # После count_follow: нужен уже увеличенный счётчик подписчиков.
+    if created:
+        timeline.promote(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    with transaction.atomic():
+        counters.change_user(instance.user_id, 'following_count', -1)
+        counters.change_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, **kwargs):
+    search.index_post(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.id)
+
+
+@receiver(post_save, sender=Post)
+def index_tags(sender, instance, created, **kwargs):
+    # Старые теги берутся из текста до правки, в базу идём, только если
+    # текст не загружался.
+    old_text = instance._saved_text
+    if created:
+        old_tags = {}
+    elif old_text is DEFERRED:
+        old_tags = tags.indexed([instance.id])
+    else:
+        old_tags = {instance.id: tags.extract(old_text)}
+    tags.sync([instance], old_tags)
+    instance._saved_text = instance.text
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    search.index_comment(instance, created)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex_comment(instance.id)
+
+
+@receiver(post_save, sender=Post)
+def trend_post(sender, instance, created, **kwargs):
+    if created:
+        trending.post_published(instance)
+
+
+@receiver(post_save, sender=Comment)
+def trend_comment(sender, instance, created, **kwargs):
+    if created:
+        trending.comment_added(instance)
+
+
+@receiver(post_save, sender=Follow)
+def trend_follow(sender, instance, created, **kwargs):
+    if created:
+        trending.author_followed(instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def untrend_post(sender, instance, **kwargs):
+    trending.forget(Trend.POST, instance.id)
+
+
+@receiver(post_delete, sender=Group)
+def untrend_group(sender, instance, **kwargs):
+    trending.forget(Trend.GROUP, instance.id)
+
+
+# Версии сбрасываются после обновления лент, иначе параллельный запрос
+# успеет закэшировать ленту без нового поста под новой версией.
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_feeds(sender, **kwargs):
+    bump_version('posts')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields=None,
+                      **kwargs):
+    # Имя автора выводится в карточках лент; вход на сайт пишет только
+    # last_login и ленты не меняет.
+    if not created and update_fields != {'last_login'}:
+        bump_version('posts')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follows(sender, instance, **kwargs):
+    bump_version(f'follow:{instance.user_id}')
@@ -0,0 +1,57 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Имя файла - SHA-256 его содержимого, поэтому одна и та же картинка,
+загруженная много раз, лежит на диске один раз и делит с копиями
+миниатюры sorl. Сколько постов ссылается на файл, считает
+posts.models.ImageBlob; файл удаляется, когда ссылок не остаётся.
+
+Файлы раскладываются по двум уровням подкаталогов из первых байтов
+хэша (posts/ab/cd/abcd...png), чтобы ни в одном каталоге не копились
+миллионы файлов. Миниатюры sorl уже разложены так же: cache/ab/cd/.
+Старые файлы переносит команда shard_media.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+SHARD_LEVELS: int = 2
+SHARDED_NAME = re.compile(
+    r'(^|/)' + r'[0-9a-f]{2}/' * SHARD_LEVELS + r'[0-9a-f]{64}(\.\w+)?$')
+
+
+def shard(digest):
+    """Подкаталоги файла: по 256 на каждом из SHARD_LEVELS уровней."""
+    return [digest[level * 2:level * 2 + 2] for level in range(SHARD_LEVELS)]
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        """Имя по хэшу содержимого: файл читается кусками, не целиком."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = digest.hexdigest()
+        return os.path.join(directory, *shard(digest), digest + extension)
+
+    @staticmethod
+    def is_sharded(name):
+        return bool(SHARDED_NAME.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        # При гонке двух одинаковых загрузок вторая получит суффикс от
+        # get_available_name - лишняя копия, но не потеря файла.
+        return super().save(name, content, max_length)
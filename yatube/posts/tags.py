@@ -0,0 +1,68 @@
+"""Хэштеги постов и лента по тегу.
+
+Теги (#слово) выделяются из текста поста при сохранении и хранятся в
+PostTag - по строке на пару (тег, пост) вместе с датой поста. Лента тега
+читается курсором по индексу (tag, -pub_date, -post), как лента
+подписок из TimelineEntry, без поиска по текстам постов.
+
+При правке поста сравниваются старый и новый наборы тегов, так что
+удаляются и добавляются только изменившиеся строки.
+"""
+import re
+
+from .models import PostQuerySet, PostTag
+
+# Тег - слово после # хотя бы с одной буквой; #2022 и якоря ссылок
+# вроде /#top тегами не считаются.
+TAG = re.compile(r'(?<![\w#/&])#(\w*[^\W\d_]\w*)')
+MAX_LENGTH: int = PostTag._meta.get_field('tag').max_length
+BATCH_SIZE: int = 300
+TAG_KEYS: tuple = ('pub_date', 'post_id')
+
+
+def extract(text):
+    """Множество тегов текста в нижнем регистре, без #."""
+    return {tag.lower() for tag in TAG.findall(text)
+            if len(tag) <= MAX_LENGTH}
+
+
+def indexed(post_ids):
+    """Теги постов, которые уже лежат в PostTag: {id поста: теги}."""
+    result = {post_id: set() for post_id in post_ids}
+    rows = (PostTag.objects.filter(post_id__in=post_ids)
+            .values_list('post_id', 'tag'))
+    for post_id, tag in rows.iterator():
+        result[post_id].add(tag)
+    return result
+
+
+def sync(posts, old_tags):
+    """Приводит PostTag к текстам posts.
+
+    old_tags - {id поста: теги в индексе}. Добавление идёт одним
+    bulk_create на все посты, удаление - запросом на пост, у которого
+    теги пропали.
+    """
+    added = []
+    for post in posts:
+        new = extract(post.text)
+        old = old_tags.get(post.id, set())
+        if old - new:
+            PostTag.objects.filter(post_id=post.id,
+                                   tag__in=old - new).delete()
+        added.extend(PostTag(tag=tag, post_id=post.id,
+                             pub_date=post.pub_date)
+                     for tag in new - old)
+    PostTag.objects.bulk_create(added, batch_size=BATCH_SIZE,
+                                ignore_conflicts=True)
+    return len(added)
+
+
+def streams(tag):
+    """Поток для CursorPaginator: записи тега вместе с постами."""
+    entries = (PostTag.objects.filter(tag=tag.lower())
+               .select_related('post__author', 'post__group')
+               .only('pub_date', 'post',
+                     *(f'post__{field}'
+                       for field in PostQuerySet.FEED_FIELDS)))
+    return [(entries, TAG_KEYS)]
@@ -0,0 +1,94 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+# Карточка поста кэшируется до его изменения, см. post_card.html.
+CARD_TIMEOUT: int = 60 * 60 * 24 * 7
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp',
+}
+
+
+def _fitted(variants, width):
+    """Варианты без увеличения: все уже оригинала и один во всю его
+    ширину, с настоящей шириной для srcset."""
+    fitted = []
+    for variant, thumb in variants:
+        fitted.append((min(variant, width), thumb))
+        if variant >= width:
+            break
+    return fitted
+
+
+def _card_sources(post):
+    if not hasattr(post, 'card_sources'):
+        post.card_sources = thumbnails.find_sources(post.image.name)
+    return post.card_sources
+
+
+def _sources(post, detail):
+    if not detail:
+        return _card_sources(post)
+    sources = thumbnails.find_sources(post.image.name, detail=True)
+    if sources is None:
+        return None
+    return [(image_format, _fitted(variants, post.image_width))
+            for image_format, variants in sources]
+
+
+@register.simple_tag
+def card_timeout(post):
+    """Время жизни кэша карточки поста.
+
+    Карточка, в которой вместо картинки заглушка, не кэшируется: иначе
+    она показывалась бы и после того, как пул нарежет миниатюры.
+    """
+    if post.image and _card_sources(post) is None:
+        return 0
+    return CARD_TIMEOUT
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post, detail=False):
+    """Картинка поста в <picture> с srcset по всем вариантам.
+
+    Карточка обрезана до CARD_SIZE. С detail=True картинка выводится
+    целиком, а высота для атрибутов <img> считается по сохранённым
+    размерам оригинала, так что место под неё занято до загрузки. Пока
+    размеры не известны (см. команду describe_images), выводится карточка.
+
+    Варианты карточки берутся из post.card_sources, если страницу уже
+    обработал thumbnails.prefetch. Тег ничего не нарезает: если готовы
+    не все варианты, выводится заглушка, а картинка уходит в пул.
+    """
+    if not post.image:
+        return {}
+    detail = bool(detail and post.image_width and post.image_height)
+    if detail:
+        width, height = thumbnails.detail_size(post.image_width,
+                                               post.image_height)
+    else:
+        # Размер карточки известен заранее: sorl режет её ровно в CARD_SIZE.
+        width, height = thumbnails.CARD_SIZE
+    context = {'width': width, 'height': height,
+               'placeholder': post.image_placeholder}
+    image_sources = _sources(post, detail)
+    if image_sources is None:
+        thumbnails.request(post.image.name)
+        return context
+    sources = []
+    for image_format, variants in image_sources:
+        sources.append({
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(f'{thumb.url} {width}w'
+                                for width, thumb in variants),
+            'default': variants[len(variants) // 2][1],
+        })
+    *preferred, fallback = sources
+    return dict(context, sources=preferred, fallback=fallback)
@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from posts import tags
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def link_tags(text, autoescape=True):
+    """Текст поста, в котором хэштеги ведут на ленту тега."""
+    escape = conditional_escape if autoescape else str
+    # split с группой чередует куски текста и теги без #.
+    parts = tags.TAG.split(text)
+    for index in range(1, len(parts), 2):
+        tag = parts[index]
+        if len(tag) > tags.MAX_LENGTH:
+            parts[index] = escape(f'#{tag}')
+            continue
+        url = reverse('posts:tag_posts', args=[tag.lower()])
+        parts[index] = format_html('<a href="{}">#{}</a>', url, tag)
+    parts[::2] = map(escape, parts[::2])
+    return mark_safe(''.join(parts))
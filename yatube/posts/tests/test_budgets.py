@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from posts import benchmarks, image_benchmarks, thumbnails
+from posts.models import Comment, Follow, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class RouteBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = benchmarks.seed(posts=120, users=15, follows=6,
+                                     groups=3)
+
+    def test_every_route_has_budget(self):
+        '''У каждого маршрута posts объявлен бюджет'''
+        names = {name for name, url in benchmarks.route_urls(self.reader)}
+        self.assertEqual(names, set(benchmarks.ROUTE_BUDGETS))
+
+    def test_routes_within_query_budget(self):
+        '''Маршруты укладываются в бюджет запросов к БД'''
+        results = benchmarks.run(self.reader)
+        # Замер не пустой: холодная главная точно ходит в базу.
+        index, = (result for result in results if result.name == 'index')
+        self.assertGreater(index.queries, 0)
+        for result in results:
+            with self.subTest(route=result.name):
+                self.assertIn(result.status, (200, 302))
+                self.assertLessEqual(
+                    result.queries,
+                    benchmarks.ROUTE_BUDGETS[result.name].queries)
+
+    def test_write_routes_rolled_back(self):
+        '''Маршруты записи пишут на каждом проходе и откатываются'''
+        before = (Post.objects.count(), Comment.objects.count(),
+                  Follow.objects.count())
+        with patch('posts.signals.counters.change_post') as change_post:
+            results = {result.name: result
+                       for result in benchmarks.run(self.reader)}
+        # Комментарий создаётся на каждом из трёх проходов.
+        self.assertEqual(change_post.call_count, 3)
+        self.assertEqual((Post.objects.count(), Comment.objects.count(),
+                          Follow.objects.count()), before)
+        for name in ('post_create', 'add_comment', 'profile_follow',
+                     'profile_unfollow'):
+            with self.subTest(route=name):
+                self.assertEqual(results[name].status, 302)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageBenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_percentile(self):
+        '''Перцентиль по ближайшему рангу'''
+        values = list(range(1, 101))
+        self.assertEqual(image_benchmarks.percentile(values, 0.5), 50)
+        self.assertEqual(image_benchmarks.percentile(values, 0.99), 99)
+        self.assertEqual(image_benchmarks.percentile([7], 0.99), 7)
+
+    @patch.object(image_benchmarks, 'SIZES', ((48, 32), (32, 48)))
+    @patch.object(thumbnails, 'CARD_WIDTHS', (48,))
+    def test_serial_run_uploads_every_image(self):
+        '''Каждая картинка сохраняется в пост и нарезается'''
+        author = User.objects.create_user(username='bench')
+        images = list(image_benchmarks.synthetic_images(4))
+        self.assertEqual(len({content for name, content in images}), 4)
+        result = image_benchmarks.run('serial', images, author.id)
+        self.assertEqual(result.images, 4)
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertLessEqual(result.p50, result.p99)
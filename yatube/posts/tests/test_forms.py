@@ -1,18 +1,23 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest.mock import patch
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image
 
 from posts.forms import PostForm, CommentForm
 from posts.models import Post, Group, User, Comment
+from posts.uploads import LimitedUploadHandler
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class TaskCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -109,3 +114,76 @@ class TaskCreateFormTests(TestCase):
         self.assertRedirects(response, reverse('posts:post_detail',
                                                kwargs={'post_id': 33}))
         self.assertEqual(Comment.objects.count(), comments_count + 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class UploadLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authorized_author = Client()
+        cls.authorized_author.force_login(cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, size=(40, 20)):
+        buffer = BytesIO()
+        Image.effect_noise(size, 64).save(buffer, 'PNG')
+        return SimpleUploadedFile(name='upload.png',
+                                  content=buffer.getvalue(),
+                                  content_type='image/png')
+
+    def create(self, image):
+        return self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': 'test_text', 'image': image})
+
+    def test_handler_stops_writing_over_limit(self):
+        '''Сверх лимита обработчик не пишет, но помнит настоящий размер'''
+        handler = LimitedUploadHandler()
+        handler.new_file('image', 'big.png', 'image/png', None)
+        with override_settings(POSTS_MAX_UPLOAD_SIZE=10):
+            for start in range(0, 30, 6):
+                handler.receive_data_chunk(b'x' * 6, start)
+        upload = handler.file_complete(30)
+        self.assertEqual(upload.size, 30)
+        self.assertEqual(upload.read(), b'')
+
+    def test_upload_goes_to_temporary_file(self):
+        '''Даже маленькая картинка не буферизуется в памяти'''
+        with patch('posts.forms.check_image_header') as check:
+            self.create(self.upload())
+        self.assertIsInstance(check.call_args[0][0], TemporaryUploadedFile)
+
+    @override_settings(POSTS_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        '''Файл больше POSTS_MAX_UPLOAD_SIZE не сохраняется'''
+        response = self.create(self.upload())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 0 МБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POSTS_MAX_IMAGE_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        '''Число пикселей проверяется по заголовку до раскодирования'''
+        upload = self.upload()
+        with patch.object(Image.Image, 'load') as load:
+            response = self.create(upload)
+        load.assert_not_called()
+        self.assertFormError(response, 'form', 'image',
+                             'Слишком большое изображение.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_unsupported_format_rejected(self):
+        '''Форматы вне IMAGE_FORMATS отклоняются'''
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'BMP')
+        response = self.create(SimpleUploadedFile(
+            name='upload.bmp', content=buffer.getvalue(),
+            content_type='image/bmp'))
+        self.assertFormError(response, 'form', 'image',
+                             'Поддерживаются только JPEG, PNG, GIF и WebP.')
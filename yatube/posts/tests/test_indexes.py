@@ -0,0 +1,64 @@
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from posts import tags, timeline
+from posts.models import Comment, Follow, Group, Post, Trend
+from posts.utils import KEYSET, CursorPaginator, POSTS_ON_PAGE
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План разбирается для SQLite')
+class FeedIndexTests(TestCase):
+    """Запросы лент идут по индексу и без сортировки во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.user, text='Пост',
+                                       group=cls.group)
+
+    def feed_queries(self):
+        paginator = CursorPaginator(Post.objects.none(), POSTS_ON_PAGE)
+        streams = {
+            'index': (Post.objects.for_feed(), KEYSET),
+            'group_list': (self.group.posts.for_feed(), KEYSET),
+            'profile': (Post.objects.for_feed().filter(author=self.user),
+                        KEYSET),
+        }
+        for number, stream in enumerate(timeline.streams(self.user.id)):
+            streams[f'follow_index {number}'] = stream
+        streams['tag_posts'], = tags.streams('тег')
+        cursor = (timezone.now(), self.post.id)
+        for name, (queryset, keys) in streams.items():
+            for older in (True, False):
+                yield name, paginator.seek(queryset, keys, cursor, older)
+            yield name, paginator.seek(queryset, keys, None)
+        yield 'comments', (self.post.comments.select_related('author')
+                           .order_by('created'))
+        # Пробы date_hierarchy в админке, см. posts.utils.probe_dates.
+        day = {'gte': cursor[0], 'lt': cursor[0] + timedelta(days=1)}
+        yield 'admin dates', Post.objects.filter(
+            pub_date__gte=day['gte'], pub_date__lt=day['lt'])
+        yield 'admin comment dates', Comment.objects.filter(
+            created__gte=day['gte'], created__lt=day['lt'])
+        yield 'trending', (Trend.objects.filter(kind=Trend.POST)
+                           .order_by('-rank')[:10])
+        yield 'fan-out', (Follow.objects.filter(author=self.user)
+                          .values_list('user_id', flat=True))
+
+    def test_feed_queries_use_index(self):
+        for name, queryset in self.feed_queries():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertNotIn('TEMP B-TREE', plan)
+                for step in plan.splitlines():
+                    self.assertIn('USING', step)
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import ImageBlob, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+# Нарезка после коммита - в том же потоке, без пула.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), 'blue').save(buffer, 'PNG')
+        cls.content = buffer.getvalue()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, content=None, name='meme.PNG'):
+        return Post.objects.create(
+            author=self.author, text='test_text',
+            image=SimpleUploadedFile(name, content or self.content,
+                                     content_type='image/png'))
+
+    def test_same_content_stored_once(self):
+        '''Одинаковые картинки хранятся одним файлом с общим счётчиком'''
+        first = self.create()
+        second = self.create(name='copy.png')
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(first.image.name,
+                         f'posts/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(os.listdir(os.path.dirname(first.image.path)),
+                         [f'{digest}.png'])
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).refs, 2)
+
+    def test_last_reference_deletes_file(self):
+        '''Файл удаляется после удаления последнего поста с ним'''
+        first = self.create()
+        second = self.create()
+        storage = Post.image.field.storage
+        with patch('posts.counters.transaction.on_commit',
+                   side_effect=lambda callback: callback()):
+            first.delete()
+            self.assertTrue(storage.exists(second.image.name))
+            second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_changed_image_moves_reference(self):
+        '''Замена картинки переносит ссылку на новый файл'''
+        post = self.create()
+        old_name = post.image.name
+        post = Post.objects.get(id=post.id)
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), 'green').save(buffer, 'PNG')
+        post.image = SimpleUploadedFile('new.png', buffer.getvalue())
+        with patch('posts.counters.transaction.on_commit'):
+            post.save()
+        self.assertFalse(ImageBlob.objects.filter(name=old_name).exists())
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name).refs, 1)
+
+    def test_shard_media_moves_legacy_files(self):
+        '''shard_media переносит старые файлы и обновляет пути постов'''
+        storage = Post.image.field.storage
+        legacy = FileSystemStorage.save(storage, 'posts/legacy.png',
+                                        ContentFile(self.content))
+        for _ in range(2):
+            Post.objects.create(author=self.author, text='test_text',
+                                image=legacy)
+        with patch('posts.management.commands.shard_media.transaction'
+                   '.on_commit', side_effect=lambda callback: callback()):
+            call_command('shard_media', stdout=StringIO())
+        digest = hashlib.sha256(self.content).hexdigest()
+        new_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.png'
+        self.assertEqual(set(Post.objects.values_list('image', flat=True)),
+                         {new_name})
+        self.assertTrue(storage.exists(new_name))
+        self.assertFalse(storage.exists(legacy))
+        self.assertEqual(list(ImageBlob.objects.values_list('name', 'refs')),
+                         [(new_name, 2)])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class MediaGarbageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            author=self.author, text='test_text',
+            image=SimpleUploadedFile('used.png', buffer.getvalue()))
+        thumbnails.generate(self.post.image.name)
+        self.orphan = self.write('posts/orphan.png', age=2 * 60 * 60)
+        self.fresh = self.write('posts/fresh.png', age=0)
+        self.thumbnail = self.write('cache/ab/cd/stale.png',
+                                    age=2 * 60 * 60)
+
+    def write(self, name, age):
+        path = os.path.join(TEMP_MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'x')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def media_files(self):
+        return {os.path.join(root, name)
+                for root, dirs, files in os.walk(TEMP_MEDIA_ROOT)
+                for name in files}
+
+    def test_dry_run_keeps_files(self):
+        '''--dry-run только перечисляет сирот'''
+        before = self.media_files()
+        out = StringIO()
+        call_command('gc_media', '--dry-run', stdout=out)
+        self.assertEqual(self.media_files(), before)
+        self.assertIn('posts/orphan.png', out.getvalue())
+        self.assertIn('cache/ab/cd/stale.png', out.getvalue())
+        self.assertNotIn('fresh.png', out.getvalue())
+
+    def test_orphans_deleted(self):
+        '''Удаляются только старые файлы без ссылок'''
+        before = self.media_files()
+        call_command('gc_media', stdout=StringIO())
+        self.assertEqual(self.media_files(),
+                         before - {self.orphan, self.thumbnail})
+        self.assertTrue(os.path.exists(self.post.image.path))
+
+    def test_quarantine(self):
+        '''--quarantine переносит сирот, сохраняя пути'''
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine, ignore_errors=True)
+        call_command('gc_media', '--quarantine', quarantine,
+                     stdout=StringIO())
+        self.assertFalse(os.path.exists(self.orphan))
+        self.assertTrue(os.path.exists(
+            os.path.join(quarantine, 'posts', 'orphan.png')))
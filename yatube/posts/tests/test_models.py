@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -56,3 +59,82 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          description='Описание')
+        self.other_group = Group.objects.create(title='Другая', slug='other',
+                                                description='Описание')
+
+    def assertCounters(self):
+        """Счётчики совпадают с честным COUNT(*)."""
+        for user in (self.author, self.reader):
+            stats = UserStats.objects.get(user=user)
+            self.assertEqual(stats.posts_count, user.posts.count())
+            self.assertEqual(stats.followers_count, user.following.count())
+            self.assertEqual(stats.following_count, user.follower.count())
+        for group in Group.objects.all():
+            self.assertEqual(group.posts_count, group.posts.count())
+        for post in Post.objects.all():
+            self.assertEqual(post.comments_count, post.comments.count())
+
+    def test_counters_follow_changes(self):
+        """Сигналы поддерживают счётчики при создании, правке и удалении."""
+        post = Post.objects.create(author=self.author, text='Пост',
+                                   group=self.group)
+        Post.objects.create(author=self.author, text='Пост 2')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCounters()
+        post = Post.objects.get(id=post.id)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters()
+        Follow.objects.all().delete()
+        post.delete()
+        self.assertCounters()
+
+    def test_save_keeps_counters(self):
+        """save() загруженной раньше записи не затирает счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост',
+                                   group=self.group)
+        group = Group.objects.get(id=self.group.id)
+        post = Post.objects.get(id=post.id)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Ком')
+        Post.objects.create(author=self.author, text='Пост 2',
+                            group=self.group)
+        post.text = 'Правка'
+        post.save()
+        group.description = 'Новое описание'
+        group.save()
+        self.assertCounters()
+        comment.delete()
+        post.delete()
+        self.assertCounters()
+
+    def test_decrement_stops_at_zero(self):
+        """Разошедшийся счётчик не уходит ниже нуля при удалении."""
+        post = Post.objects.create(author=self.author, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        Post.objects.update(comments_count=0)
+        Group.objects.update(posts_count=0)
+        post.delete()
+        self.assertEqual(Group.objects.get(id=self.group.id).posts_count, 0)
+
+    def test_recount_command(self):
+        """recount_counters чинит разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост',
+                                   group=self.group)
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        UserStats.objects.filter(user=self.reader).delete()
+        UserStats.objects.update(posts_count=7)
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters()
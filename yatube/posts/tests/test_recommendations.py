@@ -0,0 +1,70 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import recommendations
+from posts.models import Follow, Recommendation
+
+User = get_user_model()
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # reader -> writer -> star, reader -> writer <- fan -> idol.
+        cls.reader, cls.writer, cls.star, cls.fan, cls.idol = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'writer', 'star', 'fan', 'idol'))
+        for user, author in ((cls.reader, cls.writer),
+                             (cls.writer, cls.star),
+                             (cls.fan, cls.writer), (cls.fan, cls.idol)):
+            Follow.objects.create(user=user, author=author)
+
+    def recommended(self, user):
+        return list(user.recommendations.order_by('-score', 'author_id')
+                    .values_list('author__username', flat=True))
+
+    def test_graph(self):
+        '''CSR-граф отдаёт соседей узла и прореживает длинные строки'''
+        graph = recommendations.Graph.from_edges(
+            [(0, 1), (0, 2), (2, 0)], 3)
+        self.assertEqual(list(graph.row(0)), [1, 2])
+        self.assertEqual(list(graph.row(1)), [])
+        self.assertEqual(list(graph.row(7)), [])
+        graph = recommendations.Graph.from_edges(
+            ((0, target) for target in range(1, 200)), 200)
+        with patch.object(recommendations, 'SAMPLE', 10):
+            self.assertLessEqual(len(graph.sample(0)), 10)
+
+    def test_friends_and_cofollows(self):
+        '''Друзья друзей весят больше соподписок, свои подписки - нет'''
+        call_command('recommend_follows', workers=1, stdout=StringIO())
+        self.assertEqual(self.recommended(self.reader), ['star', 'idol'])
+        self.assertNotIn('writer', self.recommended(self.fan))
+
+    def test_parallel_matches_serial(self):
+        '''Пул процессов даёт те же рекомендации, что и один процесс'''
+        recommendations.run(workers=1)
+        serial = sorted(Recommendation.objects.values_list(
+            'user_id', 'author_id', 'score'))
+        recommendations.run(workers=2, chunk_size=2)
+        self.assertEqual(sorted(Recommendation.objects.values_list(
+            'user_id', 'author_id', 'score')), serial)
+
+    def test_sidebar(self):
+        '''Панель на profile и follow_index без уже выбранных авторов'''
+        recommendations.run(workers=1)
+        Follow.objects.create(user=self.reader, author=self.idol)
+        client = Client()
+        client.force_login(self.reader)
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:profile', args=['reader'])):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(
+                    [item.author for item in response.context['suggestions']],
+                    [self.star])
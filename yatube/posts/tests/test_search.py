@@ -0,0 +1,106 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.in_text = Post.objects.create(author=cls.author,
+                                          text='Концерт в субботу')
+        cls.in_comment = Post.objects.create(author=cls.author,
+                                             text='Фотографии')
+        Comment.objects.create(post=cls.in_comment, author=cls.author,
+                               text='Отличный концерт')
+        cls.other = Post.objects.create(author=cls.author,
+                                        text='Совсем про другое')
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.id for post in response.context['page_obj']]
+
+    def test_ranked_by_text_then_comments(self):
+        '''Совпадение в тексте поста выше совпадения в комментарии'''
+        self.assertEqual(self.found('КОНЦЕРТ'),
+                         [self.in_text.id, self.in_comment.id])
+
+    def test_prefix_and_all_words(self):
+        '''Слова ищутся как префиксы и должны встретиться все'''
+        self.assertEqual(self.found('конц суб'), [self.in_text.id])
+
+    def test_index_follows_changes(self):
+        '''Правка и удаление поста и комментария меняют индекс'''
+        post = Post.objects.get(id=self.in_text.id)
+        post.text = 'Лекция в субботу'
+        post.save()
+        self.in_comment.comments.all().delete()
+        self.assertEqual(self.found('концерт'), [])
+        self.assertEqual(self.found('лекция'), [post.id])
+        post.delete()
+        self.assertEqual(self.found('лекция'), [])
+
+    def test_comment_indexed_alone(self):
+        '''Правка комментария меняет только его строку индекса'''
+        comment = Comment.objects.create(post=self.other, author=self.author,
+                                         text='Про выставку')
+        with CaptureQueriesContext(connection) as queries:
+            comment.text = 'Про ярмарку'
+            comment.save()
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('group_concat', sql)
+        self.assertEqual(self.found('выставку'), [])
+        self.assertEqual(self.found('ярмарку'), [self.other.id])
+        comment.delete()
+        self.assertEqual(self.found('ярмарку'), [])
+
+    @patch('posts.search.MAX_RESULTS', 1)
+    def test_ranking_capped(self):
+        '''Ранжируются и считаются не больше MAX_RESULTS совпадений'''
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'концерт'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [self.in_comment.id])
+
+    def test_query_syntax_is_escaped(self):
+        '''Операторы FTS5 в запросе не ломают поиск'''
+        for query in ('"', 'концерт OR', 'NEAR(*', '-', ''):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('posts:search'),
+                                           {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_command(self):
+        '''rebuild_search восстанавливает индекс по базе'''
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.found('концерт'),
+                         [self.in_text.id, self.in_comment.id])
+
+    def test_admin_search_uses_index(self):
+        '''Поиск в админке идёт через индекс, а не LIKE'''
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/posts/post/',
+                                       {'q': 'концерт'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn('MATCH', sql)
+        self.assertNotIn('LIKE', sql)
+        response = self.client.get('/admin/posts/comment/',
+                                   {'q': 'отличный'})
+        self.assertEqual(response.context['cl'].result_count, 1)
@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import tags
+from posts.models import Post
+
+User = get_user_model()
+
+
+class TagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tags_of(self, post):
+        return set(post.tags.values_list('tag', flat=True))
+
+    def test_extract(self):
+        '''Теги - слова после #, без чисел, якорей и повторов'''
+        self.assertEqual(
+            tags.extract('#Музыка и #музыка, #2022 site.ru/#top ##x #рок!'),
+            {'музыка', 'рок'})
+
+    def test_tags_follow_edits(self):
+        '''При правке меняются только изменившиеся теги'''
+        post = Post.objects.create(author=self.user, text='#джаз и #рок')
+        self.assertEqual(self.tags_of(post), {'джаз', 'рок'})
+        kept = post.tags.get(tag='рок').id
+        self.client.post(reverse('posts:post_edit', args=[post.id]),
+                         {'text': '#рок и #блюз'})
+        self.assertEqual(self.tags_of(post), {'рок', 'блюз'})
+        self.assertEqual(post.tags.get(tag='рок').id, kept)
+
+    def test_tag_feed(self):
+        '''Лента тега - посты с тегом, новые первыми, теги - ссылки'''
+        older = Post.objects.create(author=self.user, text='#Концерт вчера')
+        Post.objects.create(author=self.user, text='Без тегов')
+        newer = Post.objects.create(author=self.user, text='#концерт сегодня')
+        response = self.client.get(reverse('posts:tag_posts',
+                                           args=['концерт']))
+        self.assertEqual([post.id for post in response.context['page_obj']],
+                         [newer.id, older.id])
+        self.assertContains(response, 'href="{}">#Концерт</a>'.format(
+            reverse('posts:tag_posts', args=['концерт'])))
+
+    def test_backfill(self):
+        '''backfill_tags восстанавливает теги по текстам'''
+        post = Post.objects.create(author=self.user, text='#джаз #рок')
+        post.tags.filter(tag='джаз').delete()
+        Post.objects.filter(id=post.id).update(text='#джаз #блюз')
+        call_command('backfill_tags', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.tags_of(post), {'джаз', 'блюз'})
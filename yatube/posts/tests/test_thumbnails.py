@@ -0,0 +1,206 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+# Нарезка после коммита - в том же потоке, без пула.
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.authorized_author = Client()
+        cls.authorized_author.force_login(cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Одинаковые картинки делят файл и записи sorl между тестами,
+        # а кэш sorl переживает откат транзакции теста.
+        cache.clear()
+
+    def upload(self, size=(40, 20)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name='thumb.png',
+                                  content=buffer.getvalue(),
+                                  content_type='image/png')
+
+    def test_create_schedules_thumbnails(self):
+        '''post_create ставит нарезку миниатюр после коммита'''
+        with patch('posts.thumbnails.transaction.on_commit') as on_commit:
+            self.authorized_author.post(
+                reverse('posts:post_create'),
+                data={'text': 'test_text', 'image': self.upload()})
+        self.assertEqual(on_commit.call_count, 1)
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_pool_generates_in_background(self):
+        '''С THUMBNAIL_WORKERS нарезка уходит в пул потоков'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        with patch('posts.thumbnails.transaction.on_commit',
+                   side_effect=lambda callback: callback()), \
+                patch.object(thumbnails, 'executor') as executor:
+            thumbnails.schedule(post.image)
+        executor.return_value.submit.assert_called_once_with(
+            thumbnails._generate_in_pool, post.image.name)
+
+    def test_generate_fills_sorl_store(self):
+        '''generate кладёт все размеры шаблонов в хранилище sorl'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        thumbnails.generate(post.image.name)
+        source = ImageFile(post.image.name)
+        self.assertEqual(
+            len(default.kvstore._get(source.key, identity='thumbnails')),
+            2 * len(thumbnails.CARD_WIDTHS)
+            * len(thumbnails.card_formats(post.image.name)))
+
+    def test_prefetch_batches_lookups(self):
+        '''prefetch находит варианты всей страницы одним запросом'''
+        posts = [Post.objects.create(author=self.author, text='test_text',
+                                     image=self.upload())
+                 for _ in range(3)]
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+        for post in posts:
+            self.assertEqual(
+                [(image_format, [(width, thumb.name)
+                                 for width, thumb in variants])
+                 for image_format, variants in post.card_sources],
+                [(image_format, [(width, thumb.name)
+                                 for width, thumb in variants])
+                 for image_format, variants
+                 in thumbnails.card_sources(post.image.name)])
+
+    def test_prefetch_skips_missing(self):
+        '''Без нарезанных вариантов prefetch отмечает пост, не нарезая'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        thumbnails.prefetch([post])
+        self.assertIsNone(post.card_sources)
+        source = ImageFile(post.image.name)
+        self.assertIsNone(
+            default.kvstore._get(source.key, identity='thumbnails'))
+
+    def test_missing_thumbnails_render_placeholder(self):
+        '''Без миниатюр выводится заглушка, картинка уходит в пул,
+        а карточка не кэшируется'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        with patch.object(thumbnails, 'request') as request:
+            response = self.authorized_author.get(profile)
+        request.assert_called_once_with(post.image.name)
+        self.assertNotContains(response, '<picture>')
+        self.assertContains(response, post.image_placeholder)
+        source = ImageFile(post.image.name)
+        self.assertIsNone(
+            default.kvstore._get(source.key, identity='thumbnails'))
+        thumbnails.generate(post.image.name)
+        response = self.authorized_author.get(profile)
+        self.assertContains(response, '<picture>')
+
+    def test_image_described_on_upload(self):
+        '''Размеры и заглушка сохраняются с постом при загрузке'''
+        with patch('posts.thumbnails.transaction.on_commit'):
+            self.authorized_author.post(
+                reverse('posts:post_create'),
+                data={'text': 'test_text', 'image': self.upload()})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        thumbnails.generate(post.image.name)
+        response = self.authorized_author.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'width="40" height="20"')
+        self.assertContains(response, ' 40w')
+        self.assertNotContains(response, ' 480w')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+
+    def test_describe_images_fills_old_posts(self):
+        '''describe_images описывает картинки старых постов'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        Post.objects.update(image_width=None, image_height=None,
+                            image_placeholder='')
+        call_command('describe_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+        self.assertTrue(post.image_placeholder)
+
+    def test_card_formats(self):
+        '''WebP идёт первым, исходный формат остаётся запасным'''
+        with patch.object(thumbnails, 'WEBP_ENABLED', True):
+            self.assertEqual(thumbnails.card_formats('posts/a.png'),
+                             ['WEBP', 'PNG'])
+            self.assertEqual(thumbnails.card_formats('posts/a.webp'),
+                             ['WEBP'])
+        with patch.object(thumbnails, 'WEBP_ENABLED', False):
+            self.assertEqual(thumbnails.card_formats('posts/a.bmp'),
+                             ['JPEG'])
+
+    def test_post_picture_srcset(self):
+        '''Карточка выводит <picture> со всеми ширинами в srcset'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        thumbnails.generate(post.image.name)
+        response = self.authorized_author.get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'width="960" height="339"')
+        for width in thumbnails.CARD_WIDTHS:
+            self.assertContains(response, f' {width}w')
+
+    def test_detail_keeps_aspect_ratio(self):
+        '''Страница поста выводит картинку целиком по её пропорциям'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload((2000, 1000)))
+        thumbnails.generate(post.image.name)
+        response = self.authorized_author.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, 'width="960" height="480"')
+        for width in thumbnails.CARD_WIDTHS:
+            self.assertContains(response, f' {width}w')
+
+    def test_describe_images_refreshes_card(self):
+        '''После describe_images кэшированная карточка получает заглушку'''
+        post = Post.objects.create(author=self.author, text='test_text',
+                                   image=self.upload())
+        Post.objects.update(image_width=None, image_height=None,
+                            image_placeholder='')
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertNotContains(self.authorized_author.get(profile),
+                               'data:image/jpeg')
+        call_command('describe_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertContains(self.authorized_author.get(profile),
+                            post.image_placeholder)
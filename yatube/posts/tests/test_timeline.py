@@ -0,0 +1,121 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.user = User.objects.create_user(username='test_username')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def feed_ids(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.id for post in response.context['page_obj']]
+
+    def test_new_post_pushed_to_followers(self):
+        '''Новый пост попадает в ленту подписчика, чужой - нет'''
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='test_text')
+        Post.objects.create(author=self.other, text='other_text')
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_unfollow_removes_author_posts(self):
+        '''После отписки посты автора уходят из ленты'''
+        old_post = Post.objects.create(author=self.author, text='test_text')
+        self.authorized_client.get(reverse('posts:profile_follow',
+                                           kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_ids(), [old_post.id])
+        self.authorized_client.get(reverse('posts:profile_unfollow',
+                                           kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_timeline_is_capped(self):
+        '''maintain_timelines оставляет в ленте TIMELINE_SIZE записей'''
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        with patch.object(timeline, 'TIMELINE_SIZE', 3):
+            with CaptureQueriesContext(connection) as queries:
+                posts = [Post.objects.create(author=self.author,
+                                             text=str(i))
+                         for i in range(5)]
+            self.assertFalse(any(query['sql'].startswith('DELETE')
+                                 for query in queries.captured_queries))
+            call_command('maintain_timelines', stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.other).count(), 3)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user)
+                 .values_list('post_id', flat=True)),
+            [post.id for post in reversed(posts[2:])])
+
+    def test_backfill_command(self):
+        '''Команда backfill_timelines собирает ленту по подпискам'''
+        post = Post.objects.create(author=self.author, text='test_text')
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=0)
+    def test_popular_author_merged_on_read(self):
+        '''Посты популярного автора не раскладываются, а сливаются
+           с лентой при чтении'''
+        Follow.objects.create(user=self.user, author=self.other)
+        cache.clear()
+        ordinary = Post.objects.create(author=self.author, text='old')
+        TimelineEntry.objects.create(user=self.user, post=ordinary,
+                                     pub_date=ordinary.pub_date)
+        popular = [Post.objects.create(author=self.other, text=str(i))
+                   for i in range(12)]
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.other).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual([post.id for post in page_obj],
+                         [post.id for post in reversed(popular[2:])])
+        response = self.authorized_client.get(reverse('posts:follow_index'),
+                                              {'after': page_obj.next_cursor})
+        self.assertEqual([post.id for post in response.context['page_obj']],
+                         [popular[1].id, popular[0].id, ordinary.id])
+
+    @override_settings(FANOUT_FOLLOWER_THRESHOLD=1)
+    def test_author_popularity_transitions(self):
+        '''Посты, опубликованные автором в статусе популярного, остаются
+           в лентах, когда подписчиков становится меньше порога'''
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(timeline.popular_authors(), set())
+        Follow.objects.create(user=self.other, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(timeline.popular_authors(), {self.author.id})
+        self.assertNotIn('GROUP BY', queries.captured_queries[0]['sql'])
+        post = Post.objects.create(author=self.author, text='popular')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=self.other).delete()
+        cache.clear()
+        self.assertEqual(self.feed_ids(), [post.id])
+        call_command('maintain_timelines', stdout=StringIO())
+        self.assertEqual(timeline.popular_authors(), set())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=post).exists())
+        cache.clear()
+        self.assertEqual(self.feed_ids(), [post.id])
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import Comment, Group, Post, Trend
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.quiet = Post.objects.create(author=self.user, text='Тихий')
+        self.hot = Post.objects.create(author=self.user, text='Горячий',
+                                       group=self.group)
+        for number in range(3):
+            Comment.objects.create(post=self.hot, author=self.user,
+                                   text=f'Комментарий {number}')
+
+    def test_incremental_matches_rebuild(self):
+        '''Ранги от событий совпадают с пересчётом с нуля'''
+        ranks = sorted(Trend.objects.values_list('kind', 'object_id',
+                                                 'rank'))
+        trending.rebuild()
+        rebuilt = sorted(Trend.objects.values_list('kind', 'object_id',
+                                                   'rank'))
+        self.assertEqual(len(ranks), 3)
+        for (kind, object_id, rank), expected in zip(ranks, rebuilt):
+            self.assertEqual((kind, object_id), expected[:2])
+            self.assertAlmostEqual(rank, expected[2])
+
+    def test_decay(self):
+        '''Старые события весят меньше свежих'''
+        old = timezone.now() - trending.HALF_LIFE * 8
+        trending.add(Trend.POST, 1001, 100, when=old)
+        trending.add(Trend.POST, 1002, 1)
+        ranks = dict(trending.top(Trend.POST))
+        self.assertGreater(ranks[1002], ranks[1001])
+
+    def test_trending_page(self):
+        '''Страница читает список из кэша и обновляется событиями'''
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['posts']),
+                         [self.hot, self.quiet])
+        self.assertEqual(list(response.context['groups']), [self.group])
+        for number in range(5):
+            Comment.objects.create(post=self.quiet, author=self.user,
+                                   text=f'Ещё {number}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(list(response.context['posts']),
+                         [self.quiet, self.hot])
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('posts_trend', sql)
+        self.assertNotIn('posts_comment', sql)
+
+    def test_compact(self):
+        '''compact_trending убирает затухшие объекты и удалённые посты'''
+        trending.add(Trend.POST, 1001, 1,
+                     when=timezone.now() - trending.HALF_LIFE * 20)
+        self.quiet.delete()
+        call_command('compact_trending', stdout=StringIO())
+        self.assertEqual(
+            set(Trend.objects.values_list('kind', 'object_id')),
+            {(Trend.POST, self.hot.id), (Trend.GROUP, self.group.id)})
+        self.assertEqual([post_id for post_id, rank
+                          in trending.top(Trend.POST)], [self.hot.id])
@@ -1,22 +1,32 @@
 from django.core.cache import cache
+import base64
+import hashlib
 import shutil
 import tempfile
+from datetime import date, datetime
+from unittest.mock import patch
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
 
+from posts.caching import VERSION_KEY
 from posts.models import Post, Group, Comment, Follow
+from posts.utils import with_probed_dates
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostsViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -36,6 +46,10 @@ class PostsViewsTests(TestCase):
         cls.uploaded = SimpleUploadedFile(name='test.png',
                                           content=cls.small_gif,
                                           content_type='image/png')
+        # Картинка хранится под SHA-256 своего содержимого
+        # в подкаталогах по первым байтам хэша.
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest[2:4]}/{digest}.png'
         cls.post = Post.objects.create(author=cls.author,
                                        id=33,
                                        text='test_text',
@@ -88,7 +102,7 @@ class PostsViewsTests(TestCase):
         task_text_0 = first_object.text
         task_image_0 = Post.objects.first().image
         self.assertEqual(task_text_0, 'test_text')
-        self.assertEqual(task_image_0, 'posts/test.png')
+        self.assertEqual(task_image_0, self.image_name)
 
     def test_group_list_page_show_correct_context(self):
         """Шаблон group_list сформирован с правильным контекстом."""
@@ -97,7 +111,7 @@ class PostsViewsTests(TestCase):
                                 kwargs={'slug': 'test_slug'})))
         first_object = response.context['page_obj'][0]
         post_image_0 = first_object.image
-        self.assertEqual(post_image_0, 'posts/test.png')
+        self.assertEqual(post_image_0, self.image_name)
         self.assertEqual(response.context.get('group').title, 'test_title')
         self.assertEqual(response.context.get('group').slug, 'test_slug')
 
@@ -115,7 +129,7 @@ class PostsViewsTests(TestCase):
         self.assertEqual(post_author_0, 'author')
         self.assertEqual(post_group_0, 'test_title')
         self.assertEqual(post_date_0, self.post.pub_date.strftime("%Y-%m-%d"))
-        self.assertEqual(post_image_0, 'posts/test.png')
+        self.assertEqual(post_image_0, self.image_name)
 
     def test_post_detail_page_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -123,7 +137,7 @@ class PostsViewsTests(TestCase):
                                               kwargs={'post_id': '33'}))
         self.assertEqual(response.context.get('page_obj').text, 'test_text')
         self.assertEqual(response.context.get('page_obj').image,
-                         'posts/test.png')
+                         self.image_name)
 
     def test_post_edit_page_show_correct_context(self):
         """Шаблон post_edit сформирован с правильным контекстом."""
@@ -228,18 +242,65 @@ class CacheTests(TestCase):
         self.user = User.objects.create_user(username='test_username')
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
+        cache.clear()
 
     def test_cache_index(self):
         """Тест кэширования страницы posts:index"""
+        first_get = self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            second_get = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(first_get.content, second_get.content)
+
+    def test_cache_shows_renamed_author(self):
+        """Новое имя автора сразу видно в закэшированной карточке"""
+        self.guest_client.get(reverse('posts:index'))
+        author = User.objects.get(username='test_name')
+        author.first_name = 'Лев'
+        author.last_name = 'Толстой'
+        author.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Лев Толстой')
+
+    def test_cache_index_invalidated_on_edit(self):
+        """Правка поста сразу видна на закэшированной главной"""
         first_get = self.authorized_client.get(reverse('posts:index'))
-        post_1 = Post.objects.get(id=1)
-        post_1.text = 'test_text_2'
-        post_1.save()
+        self.post.text = 'test_text_2'
+        self.post.save()
         second_get = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(first_get.content, second_get.content)
-        cache.clear()
-        third_get = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(first_get.content, third_get.content)
+        self.assertNotEqual(first_get.content, second_get.content)
+        self.assertContains(second_get, 'test_text_2')
+
+    def test_cache_profile_invalidated_on_follow(self):
+        """Подписка сразу меняет кнопку на закэшированном профиле"""
+        address = reverse('posts:profile',
+                          kwargs={'username': self.post.author.username})
+        self.authorized_client.get(address)
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.post.author.username}))
+        response = self.authorized_client.get(address)
+        self.assertContains(response, 'Отписаться')
+
+    def test_cache_not_shared_between_viewers(self):
+        """Закэшированная страница одного зрителя не достаётся другому"""
+        other = User.objects.create_user(username='other_username')
+        other_client = Client()
+        other_client.force_login(other)
+        # Версии лент двух пользователей совпадают.
+        for user in (self.user, other):
+            cache.set(VERSION_KEY.format(f'follow:{user.id}'), 1, None)
+        Follow.objects.create(user=self.user, author=self.post.author)
+        for address in (reverse('posts:index'),
+                        reverse('posts:profile',
+                                args=[self.post.author.username])):
+            with self.subTest(address=address):
+                self.authorized_client.get(address)
+                self.assertNotContains(self.guest_client.get(address),
+                                       'test_username')
+        self.authorized_client.get(reverse('posts:follow_index'))
+        response = other_client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, 'test_username')
+        self.assertNotContains(response, 'test_text')
 
 
 class FollowTests(TestCase):
@@ -294,3 +355,229 @@ class FollowTests(TestCase):
                                                    self.author.username}))
         one_more_follow_count = Follow.objects.count()
         self.assertEqual(follow_count, one_more_follow_count)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        for i in range(0, 25):
+            Post.objects.create(author=cls.author, text=f'test_text_{i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_pages_walk_older_and_newer(self):
+        '''Курсоры ведут на соседние страницы без пропусков и повторов'''
+        address = reverse('posts:index')
+        first = self.guest_client.get(address).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertFalse(first.has_previous())
+        second = self.guest_client.get(
+            address, {'after': first.next_cursor}).context['page_obj']
+        third = self.guest_client.get(
+            address, {'after': second.next_cursor}).context['page_obj']
+        self.assertEqual(len(third), 5)
+        self.assertFalse(third.has_next())
+        ids = [post.id for page in (first, second, third) for post in page]
+        self.assertEqual(
+            ids, list(Post.objects.values_list('id', flat=True)
+                      .order_by('-pub_date', '-id')))
+        back = self.guest_client.get(
+            address, {'before': second.previous_cursor}).context['page_obj']
+        self.assertEqual([post.id for post in back],
+                         [post.id for post in first])
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        '''Битый курсор отдаёт первую страницу'''
+        response = self.guest_client.get(reverse('posts:index'),
+                                         {'after': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+        huge_id = base64.urlsafe_b64encode(
+            b'2030-01-01T00:00:00+00:00|99999999999999999999999').decode()
+        response = self.guest_client.get(reverse('posts:index'),
+                                         {'after': huge_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+@override_settings(POSTS_PAGINATION='window')
+class WindowedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        for i in range(0, 95):
+            Post.objects.create(author=cls.author, text=f'test_text_{i}')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_window_around_current_page(self):
+        '''Выводится только окно номеров вокруг текущей страницы'''
+        response = self.guest_client.get(reverse('posts:index'), {'page': 5})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj.window), [3, 4, 5, 6, 7])
+        self.assertEqual(page_obj.paginator.num_pages, 10)
+
+    def test_count_is_cached_until_write(self):
+        '''Число постов берётся из кэша и сбрасывается при новом посте'''
+        address = reverse('posts:group_list', kwargs={'slug': 'missing'})
+        Group.objects.create(title='title', slug='missing',
+                             description='description')
+        self.guest_client.get(address)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(address)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+        Post.objects.create(author=self.author, text='new_text',
+                            group=Group.objects.get(slug='missing'))
+        response = self.guest_client.get(address)
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='test_title',
+                                         slug='test_slug',
+                                         description='test_description')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        self.post = Post.objects.create(author=self.author, text='old_text',
+                                        group=self.group)
+        self.other = Post.objects.create(author=self.author, text='other')
+
+    def test_card_shared_between_feeds(self):
+        '''Карточка, отрисованная на главной, берётся из кэша в группе'''
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(id=self.post.id).update(text='new_text')
+        response = self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}))
+        self.assertContains(response, 'old_text')
+
+    def test_edit_invalidates_only_its_card(self):
+        '''Правка поста сбрасывает только его карточку'''
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(id=self.other.id).update(text='other_changed')
+        self.post.text = 'new_text'
+        self.post.save()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'new_text')
+        self.assertContains(response, 'other')
+        self.assertNotContains(response, 'other_changed')
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(author=self.admin, group=self.group,
+                                       text=f'Пост {number}')
+            Comment.objects.create(post=post, author=self.admin,
+                                   text=f'Комментарий {number}')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        '''Число запросов списка не зависит от числа строк'''
+        for url in ('/admin/posts/post/', '/admin/posts/comment/'):
+            with self.subTest(url=url):
+                self.add_posts(2)
+                few = self.count_queries(url)
+                self.add_posts(20)
+                self.assertEqual(self.count_queries(url), few)
+
+    def test_no_full_selects(self):
+        '''Группа в списке и в форме - автодополнение, а не полный селект'''
+        Group.objects.create(title='Другая', slug='other', description='-')
+        self.add_posts(1)
+        response = self.client.get('/admin/posts/post/')
+        self.assertContains(response, 'name="form-0-group"')
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'Группа</option>')
+        self.assertNotContains(response, 'Другая</option>')
+        post = Post.objects.get()
+        response = self.client.get(f'/admin/posts/post/{post.id}/change/')
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_group_editable_in_list(self):
+        '''Группу поста можно сменить прямо из списка'''
+        other = Group.objects.create(title='Другая', slug='other',
+                                     description='-')
+        self.add_posts(1)
+        post = Post.objects.get()
+        response = self.client.post('/admin/posts/post/', {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+            'form-0-id': post.id, 'form-0-group': other.id,
+            '_save': 'Сохранить',
+        })
+        self.assertEqual(response.status_code, 302)
+        post.refresh_from_db()
+        self.assertEqual(post.group, other)
+
+    def test_date_hierarchy(self):
+        '''Годы и месяцы для date_hierarchy находятся пробами по индексу'''
+        self.add_posts(3)
+        posts = list(Post.objects.order_by('id'))
+        Post.objects.filter(id=posts[0].id).update(
+            pub_date=datetime(2020, 3, 5, tzinfo=timezone.utc))
+        Post.objects.filter(id=posts[1].id).update(
+            pub_date=datetime(2022, 7, 1, tzinfo=timezone.utc))
+        this_year = timezone.localdate().replace(month=1, day=1)
+        probed = with_probed_dates(Post.objects.all())
+        self.assertEqual(probed.dates('pub_date', 'year'),
+                         [date(2020, 1, 1), date(2022, 1, 1), this_year])
+        self.assertEqual(
+            probed.filter(pub_date__year=2022).dates('pub_date', 'day'),
+            [date(2022, 7, 1)])
+        # Вне админки dates() остаётся обычным.
+        self.assertIsInstance(Post.objects.dates('pub_date', 'year'),
+                              QuerySet)
+        response = self.client.get('/admin/posts/post/')
+        self.assertContains(response, '?pub_date__year=2020')
+        response = self.client.get('/admin/posts/comment/')
+        self.assertContains(response, 'created__year')
+
+    @override_settings(POSTS_APPROXIMATE_COUNT=1000)
+    def test_estimated_count(self):
+        '''Без фильтров число строк - оценка, с фильтром - точный подсчёт'''
+        self.add_posts(2)
+        with patch('posts.utils.estimate_count',
+                   side_effect=lambda qs: None if qs.query.where else 5000):
+            response = self.client.get('/admin/posts/post/')
+            self.assertEqual(response.context['cl'].result_count, 5000)
+            self.assertIsNone(response.context['cl'].full_result_count)
+            response = self.client.get('/admin/posts/post/',
+                                       {'author__id__exact': self.admin.id})
+            self.assertEqual(response.context['cl'].result_count, 2)
+
+    @patch('posts.utils.ADMIN_COUNT_LIMIT', 3)
+    def test_exact_count_without_estimate(self):
+        '''Без оценки список без фильтров считается полностью'''
+        self.add_posts(5)
+        response = self.client.get('/admin/posts/post/')
+        self.assertEqual(response.context['cl'].result_count, 5)
+        response = self.client.get('/admin/posts/post/',
+                                   {'author__id__exact': self.admin.id})
+        self.assertEqual(response.context['cl'].result_count, 3)
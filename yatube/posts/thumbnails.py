@@ -0,0 +1,279 @@
+"""Варианты картинок постов и их нарезка в фоновом пуле.
+
+Карточка поста выводит картинку через <picture>: несколько ширин в WebP
+(если Pillow собран с libwebp) и те же ширины в исходном формате файла
+как запасной вариант. Страница поста показывает картинку целиком, без
+обрезки: варианты тех же ширин, высота - по пропорциям оригинала.
+
+sorl-thumbnail создаёт миниатюру при первом показе, и декодирование,
+масштабирование и сжатие достаются первому читателю поста. Здесь это
+делается сразу после сохранения поста в пуле потоков: Pillow отпускает
+GIL на тяжёлых операциях, так что потоков достаточно. Тег
+{% post_picture %} только ищет готовые миниатюры в хранилище sorl и
+ничего не нарезает: пока их нет, он выводит заглушку и отдаёт картинку
+пулу.
+"""
+import base64
+import logging
+import os
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .caching import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Карточка 960x339, ширины для srcset сохраняют пропорции.
+CARD_SIZE = (960, 339)
+CARD_WIDTHS = (480, 960, 1440)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+DETAIL_OPTIONS = {'upscale': False}
+SOURCE_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.gif': 'GIF',
+    '.webp': 'WEBP',
+}
+WEBP_ENABLED = features.check('webp')
+# Заглушка LQIP: карточка в миниатюре, встраивается в страницу data URI.
+PLACEHOLDER_SIZE = (32, 11)
+
+_executor = None
+# Картинки, нарезка которых уже стоит в пуле.
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def card_formats(name):
+    """Форматы вариантов по убыванию предпочтения, последний - запасной."""
+    extension = os.path.splitext(name)[1].lower()
+    fallback = SOURCE_FORMATS.get(extension, 'JPEG')
+    if WEBP_ENABLED and fallback != 'WEBP':
+        return ['WEBP', fallback]
+    return [fallback]
+
+
+def card_geometries():
+    """Пары (ширина, геометрия sorl) вариантов карточки."""
+    width, height = CARD_SIZE
+    for variant in CARD_WIDTHS:
+        yield variant, f'{variant}x{round(variant * height / width)}'
+
+
+def card_variants(name, image_format):
+    """Пары (ширина, миниатюра sorl) карточки в формате image_format."""
+    for variant, geometry in card_geometries():
+        yield variant, get_thumbnail(name, geometry, format=image_format,
+                                     **CARD_OPTIONS)
+
+
+def card_sources(name):
+    """Пары (формат, варианты) для тега {% post_picture %}."""
+    return [(image_format, list(card_variants(name, image_format)))
+            for image_format in card_formats(name)]
+
+
+def detail_variants(name, image_format):
+    """Пары (ширина, миниатюра sorl) картинки целиком для страницы поста.
+
+    Геометрия задаёт только ширину; уже ширины варианта картинки sorl
+    не увеличивает.
+    """
+    for variant in CARD_WIDTHS:
+        yield variant, get_thumbnail(name, str(variant), format=image_format,
+                                     **DETAIL_OPTIONS)
+
+
+def detail_sources(name):
+    """Пары (формат, варианты) для {% post_picture post detail=True %}."""
+    return [(image_format, list(detail_variants(name, image_format)))
+            for image_format in card_formats(name)]
+
+
+def detail_size(width, height):
+    """Размер картинки на странице поста по размерам оригинала."""
+    shown = min(width, CARD_SIZE[0])
+    return shown, max(1, round(shown * height / width))
+
+
+def _thumbnail_file(source, geometry, options):
+    """Файл миниатюры без обращения к хранилищу, как в get_thumbnail."""
+    backend = default.backend
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(default_settings, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def _get_many(keys):
+    """Значения хранилища sorl: один get_many в кэш и один запрос к БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        values = {key: kvstore._get_raw(key) for key in keys}
+        return {key: value for key, value in values.items() if value}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(key__in=missing)
+                     .values_list('key', 'value'))
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    # Отсутствие ключа sorl кэширует особым значением - это не строка.
+    return {key: value for key, value in values.items()
+            if isinstance(value, str)}
+
+
+def _expected(name, detail=False):
+    """Пары (формат, варианты) с файлами миниатюр, какими их назовёт
+    sorl, - без обращения к хранилищу."""
+    source = ImageFile(name)
+    if detail:
+        geometries = [(variant, str(variant)) for variant in CARD_WIDTHS]
+        options = DETAIL_OPTIONS
+    else:
+        geometries = list(card_geometries())
+        options = CARD_OPTIONS
+    return [(image_format, [
+        (variant, _thumbnail_file(source, geometry,
+                                  dict(options, format=image_format)))
+        for variant, geometry in geometries])
+        for image_format in card_formats(name)]
+
+
+def _resolve(expected, values):
+    """Готовые варианты из значений хранилища или None, если нарезаны
+    не все."""
+    try:
+        return [(image_format, [
+            (variant, deserialize_image_file(
+                values[add_prefix(thumbnail.key)]))
+            for variant, thumbnail in variants])
+            for image_format, variants in expected]
+    except KeyError:
+        return None
+
+
+def _keys(expected):
+    return [add_prefix(thumbnail.key)
+            for image_format, variants in expected
+            for variant, thumbnail in variants]
+
+
+def find_sources(name, detail=False):
+    """Готовые варианты картинки name или None, если нарезаны не все.
+
+    В отличие от card_sources и detail_sources ничего не создаёт:
+    шаблоны видят только миниатюры, которые уже нарезал пул.
+    """
+    expected = _expected(name, detail)
+    return _resolve(expected, _get_many(_keys(expected)))
+
+
+def prefetch(posts):
+    """Находит готовые варианты картинок всей страницы постов разом.
+
+    Ключи всех вариантов страницы читаются одним обращением к кэшу и,
+    для промахов, одним запросом к БД; результат кладётся в
+    post.card_sources. У постов, для которых нарезаны не все варианты,
+    там None - карточка выводит заглушку.
+    """
+    wanted = [(post, _expected(post.image.name))
+              for post in posts if post.image]
+    if not wanted:
+        return
+    values = _get_many([key for post, expected in wanted
+                        for key in _keys(expected)])
+    for post, expected in wanted:
+        post.card_sources = _resolve(expected, values)
+
+
+def describe(file):
+    """Ширина, высота и заглушка-data URI картинки из файла file.
+
+    Для JPEG Pillow раскодирует сразу уменьшенную копию (draft), так что
+    полный размер в память не попадает.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image.draft('RGB', (PLACEHOLDER_SIZE[0] * 4, PLACEHOLDER_SIZE[1] * 4))
+        placeholder = ImageOps.fit(image.convert('RGB'), PLACEHOLDER_SIZE)
+    file.seek(0)
+    buffer = BytesIO()
+    placeholder.save(buffer, 'JPEG', quality=40)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return width, height, f'data:image/jpeg;base64,{data}'
+
+
+def generate(name):
+    """Создаёт все варианты картинки name, уже готовые не трогает."""
+    try:
+        card_sources(name)
+        detail_sources(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    else:
+        # Страницы лент с заглушкой вместо картинки больше не нужны.
+        bump_version('posts')
+
+
+def _generate_in_pool(name):
+    try:
+        generate(name)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+        # У потока пула своё соединение с БД хранилища sorl.
+        connections.close_all()
+
+
+def request(name):
+    """Отдаёт нарезку картинки name пулу, если её там ещё нет.
+
+    Шаблон, не нашедший готовых миниатюр, вызывает это вместо нарезки
+    на месте. Без пула (THUMBNAIL_WORKERS = 0) ничего не делает.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        return
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    executor().submit(_generate_in_pool, name)
+
+
+def schedule(image):
+    """Ставит нарезку миниатюр в очередь после коммита транзакции."""
+    if not image:
+        return
+    name = image.name
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: request(name))
+    else:
+        transaction.on_commit(lambda: generate(name))
@@ -0,0 +1,183 @@
+"""Лента избранных авторов, материализованная при публикации поста.
+
+Для каждого подписчика хранится не больше TIMELINE_SIZE последних записей,
+поэтому follow_index читает одну короткую выборку по индексу
+(user, -pub_date) вместо соединения Follow и Post.
+
+Посты авторов, у которых подписчиков больше
+settings.FANOUT_FOLLOWER_THRESHOLD, по лентам не раскладываются:
+их читают при показе ленты отдельными потоками и сливают с ней. Такие
+авторы отмечены флагом UserStats.fanout_on_read. Флаг ставится сразу,
+как только подписчиков стало больше порога. Снимает его
+maintain_timelines, когда число подписчиков опустилось до порога: до
+этого она раскладывает по лентам посты, которые автор опубликовал,
+пока был популярным, иначе они пропали бы из лент.
+
+Публикация ленты не подрезает: лишние записи только занимают место,
+чтение всё равно берёт первые строки по индексу. Их удаляет
+периодическая команда maintain_timelines.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import Follow, Post, PostQuerySet, TimelineEntry, UserStats
+from .utils import KEYSET
+
+TIMELINE_SIZE: int = 800
+BATCH_SIZE: int = 300
+TIMELINE_KEYS: tuple = ('pub_date', 'post_id')
+POPULAR_KEY = 'timeline:popular_authors'
+POPULAR_TIMEOUT: int = 60 * 10
+
+
+def popular_authors():
+    """Множество id авторов, чьи посты сливаются с лентой при чтении."""
+    authors = cache.get(POPULAR_KEY)
+    if authors is None:
+        authors = set(UserStats.objects.filter(fanout_on_read=True)
+                      .values_list('user_id', flat=True))
+        cache.set(POPULAR_KEY, authors, POPULAR_TIMEOUT)
+    return authors
+
+
+def promote(author_id):
+    """Отмечает автора популярным, если подписчиков больше порога."""
+    if UserStats.objects.filter(
+            user_id=author_id, fanout_on_read=False,
+            followers_count__gt=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(fanout_on_read=True):
+        cache.delete(POPULAR_KEY)
+
+
+def demote(author_id):
+    """Раскладывает последние посты автора по лентам всех подписчиков
+    и снимает с него флаг популярного."""
+    # Флаг снимается первым: посты, опубликованные во время раскладки,
+    # разложит уже push_post.
+    UserStats.objects.filter(user_id=author_id).update(fanout_on_read=False)
+    cache.delete(POPULAR_KEY)
+    followers = (Follow.objects.filter(author_id=author_id)
+                 .values_list('user_id', flat=True).iterator())
+    while True:
+        batch = list(islice(followers, BATCH_SIZE))
+        if not batch:
+            break
+        _fill(batch, author_id)
+
+
+def rebalance():
+    """Приводит флаги популярных авторов к текущему числу подписчиков.
+
+    Возвращает пару (отмечено, снято).
+    """
+    threshold = settings.FANOUT_FOLLOWER_THRESHOLD
+    promoted = UserStats.objects.filter(
+        fanout_on_read=False, followers_count__gt=threshold
+    ).update(fanout_on_read=True)
+    if promoted:
+        cache.delete(POPULAR_KEY)
+    demoted = list(UserStats.objects.filter(
+        fanout_on_read=True, followers_count__lte=threshold
+    ).values_list('user_id', flat=True))
+    for author_id in demoted:
+        demote(author_id)
+    return promoted, len(demoted)
+
+
+def trim(user_ids):
+    """Отрезает в лентах user_ids записи старше TIMELINE_SIZE последних.
+
+    Один DELETE на все ленты: граница каждой ленты - коррелированный
+    подзапрос по индексу (user, -pub_date).
+    """
+    boundary = (TimelineEntry.objects.filter(user_id=OuterRef('user_id'))
+                .order_by('-pub_date')
+                .values('pub_date')[TIMELINE_SIZE:TIMELINE_SIZE + 1])
+    return TimelineEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lte=Subquery(boundary)).delete()[0]
+
+
+def overfull_users():
+    """id подписчиков, в лентах которых больше TIMELINE_SIZE записей."""
+    return (TimelineEntry.objects.order_by().values('user_id')
+            .annotate(entries=Count('id'))
+            .filter(entries__gt=TIMELINE_SIZE)
+            .values_list('user_id', flat=True))
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in popular_authors():
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def add_author(user_id, author_id):
+    """Подмешивает в ленту последние посты автора после подписки."""
+    if author_id not in popular_authors():
+        _fill([user_id], author_id)
+
+
+def _fill(user_ids, author_id):
+    """Кладёт TIMELINE_SIZE последних постов автора в ленты user_ids."""
+    posts = list(Post.objects.filter(author_id=author_id)
+                 .order_by('-pub_date', '-id')
+                 .values_list('id', 'pub_date')[:TIMELINE_SIZE])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id in user_ids for post_id, pub_date in posts),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim(user_ids)
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 post__author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    """Собирает ленту подписчика заново по текущим подпискам."""
+    posts = (Post.objects.filter(author__following__user_id=user_id)
+             .exclude(author_id__in=popular_authors())
+             .order_by('-pub_date', '-id')
+             .values_list('id', 'pub_date')[:TIMELINE_SIZE])
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, post_id=post_id,
+                           pub_date=pub_date)
+             for post_id, pub_date in posts),
+            batch_size=BATCH_SIZE)
+
+
+def streams(user_id):
+    """Потоки для CursorPaginator: материализованная лента и по одному
+    потоку на каждого популярного автора из подписок."""
+    entries = (TimelineEntry.objects.filter(user_id=user_id)
+               .select_related('post__author', 'post__group')
+               .only('pub_date', 'post',
+                     *(f'post__{field}'
+                       for field in PostQuerySet.FEED_FIELDS)))
+    result = [(entries, TIMELINE_KEYS)]
+    popular = (Follow.objects.filter(user_id=user_id,
+                                     author_id__in=popular_authors())
+               .values_list('author_id', flat=True))
+    for author_id in popular:
+        posts = Post.objects.for_feed().filter(author_id=author_id)
+        result.append((posts, KEYSET))
+    return result
+
+
+def as_posts(rows):
+    return [row.post if isinstance(row, TimelineEntry) else row
+            for row in rows]
@@ -0,0 +1,191 @@
+"""Популярные посты и группы.
+
+Счёт объекта - сумма весов его событий (пост, комментарий, подписка на
+автора), и каждый вес вдвое затухает за HALF_LIFE. В базе хранится не
+сам счёт, а ранг - логарифм счёта, приведённого к общей точке EPOCH:
+
+    rank = log2(sum(weight * 2 ** ((time - EPOCH) / HALF_LIFE)))
+
+Затухание у всех объектов одинаковое, поэтому порядок по rank со
+временем не меняется и индекс (kind, -rank) сразу отдаёт лучших, а
+текущий счёт равен 2 ** (rank - clock()). Событие меняет ранг одним
+UPDATE по формуле log2(2**a + 2**b) = max(a, b) + log2(1 + 2**-|a - b|),
+не читая строку и не трогая остальные.
+
+Первые TOP_K объектов каждого вида лежат в кэше и правятся на каждом
+событии, так что страница трендов не считает комментарии, а читает
+список из кэша и сами посты по первичному ключу. Команда
+compact_trending удаляет затухшие строки и собирает кэш заново.
+"""
+import math
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+from .models import Comment, Post, Trend
+
+HALF_LIFE = timedelta(hours=6)
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+WEIGHTS = {'post': 1.0, 'comment': 2.0, 'follow': 3.0}
+TOP_K: int = 100
+# Строки со счётом меньше MIN_SCORE удаляет compact().
+MIN_SCORE: float = 0.01
+TOP_KEY = 'trending:{}'
+TOP_TIMEOUT: int = 60 * 60 * 24
+BATCH_SIZE: int = 500
+
+
+def clock(when=None):
+    """Время в периодах полураспада, прошедших от EPOCH."""
+    return ((when or timezone.now()) - EPOCH) / HALF_LIFE
+
+
+def _float(value):
+    return Value(value, output_field=FloatField())
+
+
+def _log_add(a, b):
+    """log2(2 ** a + 2 ** b) без переполнения."""
+    return max(a, b) + math.log2(1 + 2 ** -abs(a - b))
+
+
+def _combined(rank):
+    """_log_add(F('rank'), rank) на стороне базы."""
+    rank = _float(rank)
+    return (Greatest(F('rank'), rank)
+            + Log(_float(2), _float(1) + Power(_float(0.5),
+                                               Abs(F('rank') - rank))))
+
+
+def top(kind, limit=TOP_K):
+    """Пары (id, ранг) лучших объектов вида kind, лучшие первыми."""
+    key = TOP_KEY.format(kind)
+    items = cache.get(key)
+    if items is None:
+        items = list(Trend.objects.filter(kind=kind).order_by('-rank')
+                     .values_list('object_id', 'rank')[:TOP_K])
+        cache.set(key, items, TOP_TIMEOUT)
+    return items[:limit]
+
+
+def _offer(kind, object_id, rank):
+    """Ставит объект в top-K из кэша, если он туда теперь проходит.
+
+    Ранги только растут, поэтому объект вне списка может попасть в него
+    лишь на своём событии - другие объекты проверять не нужно.
+    """
+    key = TOP_KEY.format(kind)
+    items = cache.get(key)
+    if items is None or rank is None:
+        return
+    items = [item for item in items if item[0] != object_id]
+    if len(items) >= TOP_K and rank <= items[-1][1]:
+        return
+    items.append((object_id, rank))
+    items.sort(key=itemgetter(1), reverse=True)
+    cache.set(key, items[:TOP_K], TOP_TIMEOUT)
+
+
+def add(kind, object_id, weight, when=None):
+    """Добавляет к счёту объекта событие весом weight."""
+    if object_id is None:
+        return
+    rank = math.log2(weight) + clock(when)
+    trends = Trend.objects.filter(kind=kind, object_id=object_id)
+    if not trends.update(rank=_combined(rank)):
+        try:
+            with transaction.atomic():
+                Trend.objects.create(kind=kind, object_id=object_id,
+                                     rank=rank)
+        except IntegrityError:
+            # Строку успел создать параллельный запрос.
+            trends.update(rank=_combined(rank))
+    _offer(kind, object_id, trends.values_list('rank', flat=True).first())
+
+
+def _add_post(post_id, group_id, weight, when=None):
+    add(Trend.POST, post_id, weight, when)
+    add(Trend.GROUP, group_id, weight, when)
+
+
+def post_published(post):
+    _add_post(post.id, post.group_id, WEIGHTS['post'], post.pub_date)
+
+
+def comment_added(comment):
+    group_id = (Post.objects.filter(id=comment.post_id)
+                .values_list('group_id', flat=True).first())
+    _add_post(comment.post_id, group_id, WEIGHTS['comment'],
+              comment.created)
+
+
+def author_followed(author_id):
+    """Подписка на автора поднимает его последний пост."""
+    latest = (Post.objects.filter(author_id=author_id)
+              .order_by('-pub_date', '-id')
+              .values_list('id', 'group_id').first())
+    if latest is not None:
+        _add_post(*latest, WEIGHTS['follow'])
+
+
+def forget(kind, object_id):
+    """Убирает удалённый пост или группу из трендов."""
+    Trend.objects.filter(kind=kind, object_id=object_id).delete()
+    cache.delete(TOP_KEY.format(kind))
+
+
+def compact(now=None):
+    """Удаляет затухшие строки и собирает top-K в кэше заново.
+
+    Возвращает число удалённых строк.
+    """
+    threshold = math.log2(MIN_SCORE) + clock(now)
+    deleted = 0
+    for kind, _ in Trend.KINDS:
+        deleted += Trend.objects.filter(kind=kind,
+                                        rank__lt=threshold).delete()[0]
+        cache.delete(TOP_KEY.format(kind))
+        top(kind)
+    return deleted
+
+
+def rebuild(now=None):
+    """Пересчитывает ранги по постам и комментариям заново.
+
+    Берутся события за время, пока их вес не упал ниже MIN_SCORE.
+    Подписки в пересчёт не входят: у Follow нет даты.
+    """
+    since = (now or timezone.now()) - HALF_LIFE * math.log2(1 / MIN_SCORE)
+    ranks = {}
+
+    def account(kind, object_id, weight, when):
+        if object_id is None:
+            return
+        rank = math.log2(weight) + clock(when)
+        key = (kind, object_id)
+        ranks[key] = _log_add(ranks[key], rank) if key in ranks else rank
+
+    posts = (Post.objects.filter(pub_date__gte=since)
+             .values_list('id', 'group_id', 'pub_date'))
+    for post_id, group_id, pub_date in posts.iterator():
+        account(Trend.POST, post_id, WEIGHTS['post'], pub_date)
+        account(Trend.GROUP, group_id, WEIGHTS['post'], pub_date)
+    comments = (Comment.objects.filter(created__gte=since)
+                .values_list('post_id', 'post__group_id', 'created'))
+    for post_id, group_id, created in comments.iterator():
+        account(Trend.POST, post_id, WEIGHTS['comment'], created)
+        account(Trend.GROUP, group_id, WEIGHTS['comment'], created)
+    with transaction.atomic():
+        Trend.objects.all().delete()
+        Trend.objects.bulk_create(
+            (Trend(kind=kind, object_id=object_id, rank=rank)
+             for (kind, object_id), rank in ranks.items()),
+            batch_size=BATCH_SIZE)
+    for kind, _ in Trend.KINDS:
+        cache.delete(TOP_KEY.format(kind))
+    return len(ranks)
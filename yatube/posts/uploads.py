@@ -0,0 +1,76 @@
+"""Приём файлов из формы поста без буферизации в памяти.
+
+Django держит в памяти загрузки меньше FILE_UPLOAD_MAX_MEMORY_SIZE и
+целиком читает их при проверке ImageField. Обработчик ниже всегда пишет
+файл кусками во временный файл и перестаёт писать, как только файл
+превысил POSTS_MAX_UPLOAD_SIZE, - расход памяти и диска на загрузку не
+зависит от размера файла.
+
+Размер, формат и число пикселей картинки check_image_header проверяет
+по заголовку файла, до полной проверки и раскодирования Pillow, так что
+декомпрессионные бомбы отклоняются сразу.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Временный файл с жёстким лимитом размера.
+
+    Остаток слишком большого файла дочитывается из запроса и
+    выбрасывается, а size у файла остаётся настоящим: отклоняет такую
+    загрузку форма, и пользователь видит понятную ошибку.
+    """
+    chunk_size = 64 * 2 ** 10
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.POSTS_MAX_UPLOAD_SIZE:
+            self.file.write(raw_data)
+        elif self.file.tell():
+            self.file.seek(0)
+            self.file.truncate()
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = self.received
+        return self.file
+
+
+def check_image_header(upload):
+    """Проверяет загруженный файл по заголовку, не раскодируя пиксели."""
+    if upload.size > settings.POSTS_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.', code='too_large',
+            params={'limit': settings.POSTS_MAX_UPLOAD_SIZE // 2 ** 20})
+    if hasattr(upload, 'temporary_file_path'):
+        source = upload.temporary_file_path()
+    else:
+        source = upload
+    try:
+        # Image.open читает только заголовок.
+        with Image.open(source) as image:
+            width, height = image.size
+            image_format = image.format
+    except Image.DecompressionBombError:
+        raise ValidationError('Слишком большое изображение.',
+                              code='too_many_pixels')
+    except Exception:
+        # Не картинка: ошибку invalid_image выдаст ImageField.
+        return
+    finally:
+        upload.seek(0)
+    if image_format not in IMAGE_FORMATS:
+        raise ValidationError('Поддерживаются только JPEG, PNG, GIF и WebP.',
+                              code='format')
+    if width * height > settings.POSTS_MAX_IMAGE_PIXELS:
+        raise ValidationError('Слишком большое изображение.',
+                              code='too_many_pixels')
@@ -17,6 +17,9 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('tags/<str:tag>/', views.tag_posts, name='tag_posts'),
+    path('trending/', views.trending_list, name='trending'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,10 +1,303 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import heapq
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .caching import get_version
 
 POSTS_ON_PAGE: int = 10
+KEYSET: tuple = ('pub_date', 'id')
+PAGE_WINDOW: int = 2
+COUNT_TIMEOUT: int = 60 * 60
+ADMIN_COUNT_LIMIT: int = 10000
+# Границы id в курсоре: больше не помещается в целое СУБД (SQLite - 64 бита).
+MIN_ID: int = -2 ** 63
+MAX_ID: int = 2 ** 63 - 1
+ESTIMATE_SQL = {
+    'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+}
+
+
+def encode_cursor(pub_date, pk):
+    raw = f'{pub_date.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает пару (pub_date, pk) или None для битого курсора."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if pub_date is None or not MIN_ID <= pk <= MAX_ID:
+        return None
+    return pub_date, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id) без OFFSET и COUNT(*).
+
+    Вместо номера страницы принимает курсор: ``after`` - листаем к более
+    старым записям, ``before`` - к более новым. Стоимость запроса не
+    зависит от глубины страницы.
+
+    Вместо одного QuerySet можно передать список пар (QuerySet, keys):
+    каждый поток читается отдельно и они сливаются в одну ленту.
+    """
+
+    def __init__(self, object_list, per_page, keys=KEYSET):
+        super().__init__(object_list, per_page)
+        if isinstance(object_list, QuerySet):
+            object_list = [(object_list, keys)]
+        self.streams = list(object_list)
+        self.has_older = False
+        self.has_newer = False
+
+    def seek(self, queryset, keys, cursor, older=True):
+        """Запрос одной страницы потока после курсора cursor."""
+        date_key, id_key = keys
+        lookup = 'lt' if older else 'gt'
+        if cursor:
+            pub_date, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f'{date_key}__{lookup}': pub_date})
+                | Q(**{date_key: pub_date, f'{id_key}__{lookup}': pk})
+            )
+        sign = '-' if older else ''
+        queryset = queryset.order_by(*(sign + key for key in keys))
+        return queryset[:self.per_page + 1]
+
+    def _fetch(self, queryset, keys, cursor, older):
+        date_key, id_key = keys
+        return [((getattr(row, date_key), getattr(row, id_key)), row)
+                for row in self.seek(queryset, keys, cursor, older)]
+
+    def _merge(self, cursor, older):
+        fetched = [self._fetch(queryset, keys, cursor, older)
+                   for queryset, keys in self.streams]
+        if len(fetched) == 1:
+            return fetched[0]
+        rows = []
+        for key, row in heapq.merge(*fetched, key=itemgetter(0),
+                                    reverse=older):
+            # Один пост может прийти из двух потоков - оставляем первый.
+            if rows and rows[-1][0] == key:
+                continue
+            rows.append((key, row))
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+    def cursor_page(self, after=None, before=None):
+        after = after and decode_cursor(after)
+        before = before and decode_cursor(before)
+        older = not before
+        rows = self._merge(after or before, older)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if older:
+            self.has_older = has_more
+            self.has_newer = bool(after)
+        else:
+            rows.reverse()
+            self.has_older = True
+            self.has_newer = has_more
+        page = self._get_page([row for key, row in rows],
+                              2 if self.has_newer else 1, self)
+        page.next_cursor = (
+            encode_cursor(*rows[-1][0]) if self.has_older and rows else None)
+        page.previous_cursor = (
+            encode_cursor(*rows[0][0]) if self.has_newer and rows else None)
+        return page
+
+    @cached_property
+    def num_pages(self):
+        # Номер страницы условный: 1 - самая свежая, 2 - любая другая.
+        # Этого достаточно, чтобы has_next/has_previous у Page работали.
+        return 1 + self.has_newer + self.has_older
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике СУБД или None.
+
+    Годится только для выборки по всей таблице без фильтров.
+    """
+    sql = ESTIMATE_SQL.get(connections[queryset.db].vendor)
+    if sql is None or queryset.query.where:
+        return None
+    try:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class WindowedPaginator(Paginator):
+    """Нумерованная пагинация с окном номеров и кэшированным числом записей.
+
+    Число записей хранится в кэше до следующего изменения постов или
+    подписок. Для очень больших таблиц вместо COUNT(*) можно брать оценку
+    из статистики СУБД, см. settings.POSTS_APPROXIMATE_COUNT.
+    """
+
+    def _count_key(self):
+        query = str(self.object_list.query).encode()
+        return 'posts:count:{}:{}'.format(hashlib.md5(query).hexdigest(),
+                                          get_version('posts'))
+
+    @cached_property
+    def count(self):
+        key = self._count_key()
+        count = cache.get(key)
+        if count is None:
+            threshold = settings.POSTS_APPROXIMATE_COUNT
+            if threshold is not None:
+                count = estimate_count(self.object_list)
+                if count is not None and count < threshold:
+                    count = None
+            if count is None:
+                count = self.object_list.count()
+            cache.set(key, count, COUNT_TIMEOUT)
+        return count
+
+    def page_window(self, number):
+        first = max(1, number - PAGE_WINDOW)
+        last = min(self.num_pages, number + PAGE_WINDOW)
+        return range(first, last + 1)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        page.window = self.page_window(page.number)
+        return page
+
+
+class AdminPaginator(Paginator):
+    """Пагинатор списков админки без COUNT(*) по отфильтрованной выборке.
+
+    Без фильтров число строк точное или, если включён
+    settings.POSTS_APPROXIMATE_COUNT, оценка из статистики СУБД (как у
+    WindowedPaginator). С фильтрами или поиском строки считаются не
+    дальше ADMIN_COUNT_LIMIT: чтобы увидеть остальное, фильтр нужно сузить.
+    """
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            return self.object_list[:ADMIN_COUNT_LIMIT].count()
+        threshold = settings.POSTS_APPROXIMATE_COUNT
+        if threshold is not None:
+            count = estimate_count(self.object_list)
+            if count is not None and count >= threshold:
+                return count
+        return self.object_list.count()
+
+
+def _truncate(day, kind):
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next(day, kind):
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _start_of(day):
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def probe_dates(queryset, field_name, kind):
+    """Годы, месяцы или дни, за которые в queryset есть записи.
+
+    QuerySet.dates группирует всю выборку по усечённой дате. Здесь
+    границы берутся из Min и Max, а каждый год, месяц или день
+    проверяется отдельным EXISTS по диапазону - это поиск по индексу
+    на поле field_name, сколько бы строк ни было в таблице.
+    """
+    bounds = queryset.aggregate(first=Min(field_name), last=Max(field_name))
+    if bounds['first'] is None:
+        return []
+    first, last = (timezone.localtime(bounds[key]).date()
+                   if settings.USE_TZ else bounds[key].date()
+                   for key in ('first', 'last'))
+    days = []
+    day = _truncate(first, kind)
+    while day <= last:
+        following = _next(day, kind)
+        if queryset.filter(**{
+            f'{field_name}__gte': _start_of(day),
+            f'{field_name}__lt': _start_of(following),
+        }).exists():
+            days.append(day)
+        day = following
+    return days
+
+
+class ProbedDatesMixin:
+    """dates() для полей DateTimeField через probe_dates.
+
+    В отличие от QuerySet.dates возвращает список, а не QuerySet, поэтому
+    подмешивается только в выборки date_hierarchy админки, см.
+    with_probed_dates.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        days = probe_dates(self, field_name, kind)
+        return days[::-1] if order == 'DESC' else days
+
+
+@lru_cache(maxsize=None)
+def _probed_class(queryset_class):
+    return type(f'Probed{queryset_class.__name__}',
+                (ProbedDatesMixin, queryset_class), {})
+
+
+def with_probed_dates(queryset):
+    """Копия queryset, у которой dates() работает через probe_dates.
+
+    Класс сохраняется при filter() и прочих цепочках, так что на него
+    переходит и выборка, которую строит ChangeList.
+    """
+    clone = queryset.all()
+    clone.__class__ = _probed_class(type(queryset))
+    return clone
 
 
-def paginate(request, obj):
-    paginator = Paginator(obj, POSTS_ON_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def paginate(request, obj, keys=KEYSET) -> Page:
+    # Слияние нескольких потоков умеет только курсорная пагинация.
+    if (settings.POSTS_PAGINATION == 'window'
+            and isinstance(obj, QuerySet)):
+        paginator = WindowedPaginator(obj, POSTS_ON_PAGE)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = CursorPaginator(obj, POSTS_ON_PAGE, keys)
+    return paginator.cursor_page(after=request.GET.get('after'),
+                                 before=request.GET.get('before'))
@@ -1,29 +1,38 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
 
+from . import recommendations, tags, thumbnails, timeline, trending
+from .caching import cache_feed
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
-from .utils import paginate
+from .models import Post, Group, User, Follow, Trend
+from .search import SearchPaginator, SearchResults
+from .utils import POSTS_ON_PAGE, paginate
 
 NUM_MAX: int = 10
+TRENDING_GROUPS: int = 10
+CACHE_TIMEOUT: int = settings.FEED_CACHE_TIMEOUT
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_feed(CACHE_TIMEOUT, 'posts')
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     page_obj = paginate(request, post_list)
+    thumbnails.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_feed(CACHE_TIMEOUT, 'posts')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.all()
+    posts_list = group.posts.for_feed()
     page_obj = paginate(request, posts_list)
+    thumbnails.prefetch(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -31,23 +40,27 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_feed(CACHE_TIMEOUT, 'posts', 'follow:{request.user.id}')
 def profile(request, username):
-    fullname = User.objects.get(username=username)
-    post_list = Post.objects.filter(author=fullname)
+    fullname = User.objects.select_related('stats').get(username=username)
+    post_list = Post.objects.for_feed().filter(author=fullname)
     page_obj = paginate(request, post_list)
+    thumbnails.prefetch(page_obj)
     follow = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=fullname).exists()
     context = {
         'page_obj': page_obj,
         'fullname': fullname,
-        'follow': follow
+        'follow': follow,
+        'suggestions': recommendations.for_user(request.user),
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    comments = post.comments.all
+    post = (Post.objects.for_feed().select_related('author__stats')
+            .get(id=post_id))
+    comments = post.comments.select_related('author').order_by('created')
     context = {
         'page_obj': post,
         'comments': comments,
@@ -65,6 +78,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.schedule(post.image)
             return redirect('posts:profile', request.user)
     else:
         form = PostForm()
@@ -81,9 +95,10 @@ def post_edit(request, post_id):
                     files=request.FILES or None)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image)
         return redirect("posts:post_detail", post_id=post_id)
     else:
-        form = PostForm(instance=post)
         context = {'form': form, 'is_edit': True, 'post': post, }
         return render(request, 'posts/create_post.html', context)
 
@@ -101,13 +116,47 @@ def add_comment(request, post_id):
 
 
 @login_required
+@cache_feed(CACHE_TIMEOUT, 'posts', 'follow:{request.user.id}')
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginate(request, post_list)
-    context = {'page_obj': page_obj}
+    page_obj = paginate(request, timeline.streams(request.user.id))
+    page_obj.object_list = timeline.as_posts(page_obj)
+    thumbnails.prefetch(page_obj)
+    context = {
+        'page_obj': page_obj,
+        'suggestions': recommendations.for_user(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
+@cache_feed(CACHE_TIMEOUT, 'posts')
+def tag_posts(request, tag):
+    page_obj = paginate(request, tags.streams(tag))
+    page_obj.object_list = [entry.post for entry in page_obj]
+    thumbnails.prefetch(page_obj)
+    context = {
+        'tag': tag.lower(),
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/tag_list.html', context)
+
+
+def trending_list(request):
+    post_ids = [post_id for post_id, rank
+                in trending.top(Trend.POST, POSTS_ON_PAGE)]
+    group_ids = [group_id for group_id, rank
+                 in trending.top(Trend.GROUP, TRENDING_GROUPS)]
+    posts = Post.objects.for_feed().in_bulk(post_ids)
+    groups = Group.objects.in_bulk(group_ids)
+    posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+    thumbnails.prefetch(posts)
+    context = {
+        'posts': posts,
+        'groups': [groups[group_id] for group_id in group_ids
+                   if group_id in groups],
+    }
+    return render(request, 'posts/trending.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     author = User.objects.get(username=username)
@@ -124,3 +173,16 @@ def profile_unfollow(request, username):
     if is_follower.exists():
         is_follower.delete()
     return redirect('posts:profile', username=author)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(SearchResults(query), POSTS_ON_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    thumbnails.prefetch(page_obj)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
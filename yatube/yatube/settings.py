@@ -98,11 +98,29 @@ DATABASES = {
     }
 }
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Общий для всех воркеров memcached, например '127.0.0.1:11211'. Версии
+# кэша лент (posts.caching) сбрасывает тот воркер, который принял запись:
+# пока кэш у каждого процесса свой, остальные воркеры видят сброс только
+# по истечении срока, поэтому ленты в нём кэшируются ненадолго.
+MEMCACHED_LOCATION = os.environ.get('MEMCACHED_LOCATION')
+if MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': MEMCACHED_LOCATION,
+        }
     }
-}
+    FEED_CACHE_TIMEOUT = 60 * 60
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # Страницы по зрителям, карточки постов, ключи sorl и версии
+            # делят один кэш: 300 записей по умолчанию мало.
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+    FEED_CACHE_TIMEOUT = 20
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -147,3 +165,27 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдаёт файлы /media/: None - сам Django (core.media.serve),
+# 'x-sendfile' (Apache, lighttpd) или 'x-accel-redirect' (nginx) - прокси.
+MEDIA_SENDFILE = None
+# Внутренний location nginx для X-Accel-Redirect.
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Режим пагинации лент: 'cursor' - по курсору (pub_date, id),
+# 'window' - нумерованные страницы с окном номеров.
+POSTS_PAGINATION = 'cursor'
+# С какого размера таблицы считать записи по статистике СУБД, а не COUNT(*).
+# None - всегда точный подсчёт.
+POSTS_APPROXIMATE_COUNT = None
+# Авторам с большим числом подписчиков посты не раскладываются по лентам
+# при публикации, а подмешиваются в ленту при чтении.
+FANOUT_FOLLOWER_THRESHOLD = 10000
+# Потоки для нарезки миниатюр после загрузки картинки, чтобы запрос не ждал
+# нарезки. 0 - нарезать сразу после коммита в том же запросе (для тестов).
+THUMBNAIL_WORKERS = 2
+# Загрузки картинок пишутся во временный файл кусками, без буфера в памяти.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedUploadHandler']
+# Предел размера файла картинки в байтах и числа пикселей в ней.
+POSTS_MAX_UPLOAD_SIZE = 10 * 2 ** 20
+POSTS_MAX_IMAGE_PIXELS = 25_000_000